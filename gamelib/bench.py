@@ -0,0 +1,688 @@
+#! /usr/bin/env python
+"""
+   Micro-benchmarks for the hot spots in the game's physics.
+
+   Run from the gamelib directory:
+
+     python bench.py [benchmark ...]
+
+   With no arguments, all benchmarks are run.
+"""
+import sys
+import math
+import random
+from timeit import default_timer
+import pyglet.resource
+pyglet.resource.path = ["../data"]
+pyglet.resource.reindex()
+
+from tdgl.vec import Vec
+import bodies, collision, flowfield, hexgrid, levelfile, pathindex, world
+from tdgl import vec
+
+LEVELS = ["level{0:02}.lev".format(i) for i in range(14)]
+
+def timed(fn,repeat=3):
+    """Best time of several runs of fn()"""
+    best = None
+    for i in range(repeat):
+        t0 = default_timer()
+        fn()
+        t = default_timer() - t0
+        if best is None or t < best:
+            best = t
+    return best
+
+def report(name,count,secs,base=None):
+    rate = count / secs if secs else float('inf')
+    if base:
+        print "  {0:<28} {1:>12.0f} /s  x{2:.2f}".format(name,rate,base/secs)
+    else:
+        print "  {0:<28} {1:>12.0f} /s".format(name,rate)
+
+def bounce_balls(level,rng,balls=8,ticks=300,ms=20,
+                 maxdestroy=0,on_test=None):
+    """Bounce balls around a level from its start, as step_balls()
+    would, destroying up to maxdestroy hexes each.
+    on_test(hc,hr,x,y,r,vx,vy) is called for each hexagon that
+    collides_first() tests."""
+    r = 0.2
+    start = collision.h_centre(*level.start)
+    for b in range(balls):
+        a = rng.random() * 2 * math.pi
+        pos = start + Vec(math.cos(a),math.sin(a)) * 0.8
+        vel = Vec(math.cos(a),math.sin(a)) * 0.01
+        destroy = maxdestroy
+        for t in range(ticks):
+            v = vel * ms
+            x,y,z = pos
+            newpos = pos + v
+            obstacles = level.obstacles_near(x,y)
+            if on_test:
+                for hc,hr,cell in obstacles:
+                    on_test(hc,hr,x,y,r,v.x,v.y)
+            k,P = collision.collides_first(obstacles,pos,r,v,
+                                           collision.COLLIDE_REBOUND)
+            if P:
+                newpos,bv = P
+                vel = bv * (1.0/ms)
+                hc,hr,cell = obstacles[k]
+                if destroy > 0 and level.destroy(hc,hr):
+                    destroy -= 1
+            pos = newpos
+
+def play_trace(levelnames=LEVELS,seed=1):
+    """Record the collides() calls made by balls bouncing around
+    each level, as a list of (hcol,hrow,cx,cy,r,vx,vy) tuples"""
+    rng = random.Random(seed)
+    trace = []
+    def record(*args):
+        trace.append(args)
+    for fname in levelnames:
+        level = levelfile.load_level(fname)
+        if level:
+            bounce_balls(level,rng,on_test=record)
+    return trace
+
+def vec_collides(hcol,hrow,C,r,v=Vec(0,0),detail=collision.COLLIDE_BBOX):
+    """The original Vec-based collides(), kept for comparison"""
+    H = collision.h_centre(hcol,hrow)
+    v = Vec(v)
+    C0 = Vec(C) - H
+    C1 = C0 + v
+    left,right = C1.x - r, C1.x + r
+    top,bot = C1.y + r, C1.y - r
+    if not (left < 1 and right > -1 and bot < 1 and top > -1):
+        return False
+    if detail == collision.COLLIDE_BBOX:
+        return True
+    if not C1.length() < (1 + r):
+        return False
+    if detail == collision.COLLIDE_CIRCLE:
+        return True
+    n = C1.normalise()
+    C2 = n * (1+r)
+    if detail == collision.COLLIDE_POSITION:
+        return C2 + H
+    dots = sorted((hn.dot(n),i) for (i,hn) in enumerate(collision.H_NORMAL))
+    _,i = dots[-1]
+    n = collision.H_NORMAL[i]
+    speed = v.length()
+    v1 = C2 - C0
+    remainder = max(0.01,speed - v1.length())
+    M = C2 - v1.proj(n)
+    C3 = C0 + (M - C0)*2
+    v2 = (C3 - C2).normalise()
+    C2 += v2 * remainder
+    return C2 + H, v2 * speed
+
+def bench_collision():
+    """collides() on Vecs against collides_xy() on floats"""
+    trace = play_trace()
+    vtrace = [(hc,hr,Vec(x,y),r,Vec(vx,vy)) for hc,hr,x,y,r,vx,vy in trace]
+    hits = sum(1 for hc,hr,x,y,r,vx,vy in trace
+               if collision.collides_xy(hc,hr,x,y,r,vx,vy,3))
+    print "collision: {0} calls from play trace, {1} hits".format(
+        len(trace),hits)
+    for detail in (collision.COLLIDE_POSITION,collision.COLLIDE_REBOUND):
+        print " detail", detail
+        def original():
+            for hc,hr,C,r,v in vtrace:
+                vec_collides(hc,hr,C,r,v,detail)
+        def wrapper():
+            for hc,hr,C,r,v in vtrace:
+                collision.collides(hc,hr,C,r,v,detail)
+        def fast():
+            collides_xy = collision.collides_xy
+            for hc,hr,x,y,r,vx,vy in trace:
+                collides_xy(hc,hr,x,y,r,vx,vy,detail)
+        base = timed(original)
+        report("original Vec collides()",len(trace),base)
+        report("collides() wrapper",len(trace),timed(wrapper),base)
+        report("collides_xy()",len(trace),timed(fast),base)
+
+def hit_values(hit):
+    """A hit from collides_batch() as plain numbers, to compare"""
+    obs,P = hit
+    if not P:
+        return None
+    C,v = P
+    return obs,tuple(C),tuple(v)
+
+def bench_batch(sizes=(10,67,1000),levelname="level03.lev"):
+    """collides_batch() on many balls at once, against
+    obstacles_near() and collides_first() for each ball in turn"""
+    level = levelfile.load_level(levelname)
+    rng = random.Random(1)
+    space = [hc for hc in level.hexes if not level.is_solid(*hc)]
+    print "batch: balls in the open on {0}".format(levelname)
+    for n in sizes:
+        centres,radii,moves = [],[],[]
+        for i in range(n):
+            a = rng.random() * 2 * math.pi
+            centres.append(collision.h_centre(*rng.choice(space))
+                           + Vec(math.cos(a),math.sin(a)) * 0.5)
+            radii.append(rng.choice((0.2,0.3,0.5)))
+            a = rng.random() * 2 * math.pi
+            moves.append(Vec(math.cos(a),math.sin(a)) * 0.2)
+        def one_at_a_time():
+            found = []
+            for C,r,v in zip(centres,radii,moves):
+                obs = level.obstacles_near(C.x,C.y)
+                k,P = collision.collides_first(
+                    obs,C,r,v,collision.COLLIDE_REBOUND)
+                found.append((obs[k] if P else None,P))
+            return found
+        def all_at_once():
+            return collision.collides_batch(
+                level,centres,radii,moves,collision.COLLIDE_REBOUND)
+        hits = map(hit_values,all_at_once())
+        print " {0} balls, {1} hits, {2} differ".format(
+            n,len([h for h in hits if h]),
+            sum(1 for h,g in zip(hits,map(hit_values,one_at_a_time()))
+                if h != g))
+        repeat = max(1,20000 // n)
+        def loop():
+            for i in range(repeat):
+                one_at_a_time()
+        def batch():
+            for i in range(repeat):
+                all_at_once()
+        base = timed(loop)
+        report("one at a time",n * repeat,base)
+        report("collides_batch()",n * repeat,timed(batch),base)
+
+def bench_neighbourhoods():
+    """Level.obstacles_near() with and without the neighbourhood cache,
+    while balls destroy hexes"""
+    print "neighbourhoods: obstacles_near() on each level"
+    print "  {0:<12} {1:>8} {2:>8} {3:>10} {4:>10}".format(
+        "level","calls","hit rate","uncached","cached")
+    for fname in LEVELS:
+        times = []
+        for cached in (False,True):
+            level = levelfile.load_level(fname)
+            if not level:
+                continue
+            level.cache_neighbourhoods = cached
+            t0 = default_timer()
+            bounce_balls(level,random.Random(1),maxdestroy=4)
+            times.append(default_timer() - t0)
+        if len(times) < 2:
+            continue
+        calls = level.cache_hits + level.cache_misses
+        print "  {0:<12} {1:>8} {2:>8.1%} {3:>9.3f}s {4:>9.3f}s".format(
+            fname,calls,level.cache_hit_rate(),times[0],times[1])
+
+def bench_world(ticks=2000,ms=10):
+    """World.step() on each level, with no window, firing a
+    (harmless) HappyBall in a new direction every 300ms until
+    the player is eaten"""
+    print "world: {0} steps of {1}ms on each level".format(ticks,ms)
+    print "  {0:<12} {1:>8} {2:>10} {3:>12}".format(
+        "level","steps","secs","steps/s")
+    for fname in LEVELS:
+        level = levelfile.load_level(fname)
+        if not level:
+            continue
+        w = world.World(level,ammo=ticks,special=bodies.HappyBall,seed=1)
+        steps = 0
+        t0 = default_timer()
+        for t in range(ticks):
+            inputs = world.Inputs()
+            if t % 30 == 0:
+                a = t * 0.7
+                inputs.fire.append((Vec(math.cos(a),math.sin(a)),True))
+            w.step(ms,inputs)
+            steps += 1
+            if w.mode != "playing":
+                break
+        secs = default_timer() - t0
+        print "  {0:<12} {1:>8} {2:>9.3f}s {3:>12.0f}".format(
+            fname,steps,secs,steps / secs)
+
+def crowded_level(monsters=300,seed=1,size=80):
+    """A big level with lots of monsters (not near the start)"""
+    level = big_level(size,size,seed)
+    rng = random.Random(seed)
+    kinds = ["Shuttler","Squashy","Wanderer","Hunter"]
+    for hc in range(size):
+        for hr in range(size):
+            if ((hc,hr) not in level.hexes and hc + hr > 12
+                and len(level.monsters) < monsters):
+                if rng.random() < 0.1:
+                    level.monsters[hc,hr] = rng.choice(kinds)
+    return level.as_dict()
+
+def run_crowded(name,d,ticks,ms,base=None,**kw):
+    """Step a World of a crowded level; return the time taken"""
+    w = world.World(levelfile.Level(d),seed=1,**kw)
+    t0 = default_timer()
+    for t in range(ticks):
+        w.step(ms)
+    secs = default_timer() - t0
+    report("{0} ({1})".format(name,w.mode),ticks,secs,base)
+    return secs
+
+def bench_lod(ticks=300,ms=10,monsters=300):
+    """World.step() on a big level crowded with monsters, with and
+    without the distant ones moved less often"""
+    d = crowded_level(monsters)
+    print "lod: {0} steps of {1}ms, {2} monsters".format(
+        ticks,ms,len(d["monsters"]))
+    base = run_crowded("lod=False",d,ticks,ms)
+    run_crowded("lod=True",d,ticks,ms,base,lod=True)
+
+def bench_kinetic(ticks=300,ms=10,monsters=300):
+    """World.step() on a big level crowded with monsters, testing
+    every monster against the walls every step, or only those the
+    WallSchedule says could be touching one"""
+    d = crowded_level(monsters)
+    print "kinetic: {0} steps of {1}ms, {2} monsters".format(
+        ticks,ms,len(d["monsters"]))
+    world.World.predict_walls = False
+    try:
+        base = run_crowded("every step",d,ticks,ms)
+    finally:
+        world.World.predict_walls = True
+    run_crowded("predicted",d,ticks,ms,base)
+    run_crowded("predicted, swept",d,ticks,ms,base,swept=True)
+
+def bench_snapshot(ticks=300,ms=10,repeat=20):
+    """Starting a level again by loading it and building a new World,
+    against World.restore() of a snapshot taken at the start, after
+    playing it for a while (how much a retry costs, besides drawing)"""
+    print "snapshot: after {0} steps of {1}ms".format(ticks,ms)
+    for fname in LEVELS:
+        if not levelfile.load_level(fname):
+            continue
+        w = world.World(levelfile.load_level(fname),seed=1)
+        start = w.snapshot()
+        for t in range(ticks):
+            a = t * 0.7
+            fire = [(Vec(math.cos(a),math.sin(a)),False)]
+            w.step(ms,world.Inputs(fire=fire if t % 30 == 0 else ()))
+        def rebuild():
+            for i in range(repeat):
+                world.World(levelfile.load_level(fname),seed=1)
+        def restore():
+            for i in range(repeat):
+                w.restore(start)
+        print " ",fname
+        base = timed(rebuild)
+        report("load and build",repeat,base)
+        report("snapshot()",repeat,timed(
+            lambda: [w.snapshot() for i in range(repeat)]))
+        report("restore()",repeat,timed(restore),base)
+
+def bench_store(ticks=300,ms=10,monsters=300):
+    """World.step() on a big level crowded with monsters, with the
+    bodies' numbers in the bodies or in an EntityStore"""
+    d = crowded_level(monsters)
+    print "store: {0} steps of {1}ms, {2} monsters".format(
+        ticks,ms,len(d["monsters"]))
+    keep = world.World.store_monsters
+    world.World.store_monsters = float('inf')
+    try:
+        base = run_crowded("in bodies",d,ticks,ms)
+    finally:
+        world.World.store_monsters = keep
+    run_crowded("EntityStore",d,ticks,ms,base)
+
+def bench_streaming(sizes=(80,160,320),ticks=100,ms=10):
+    """Starting and stepping a World on bigger and bigger levels,
+    loaded whole or streamed in chunks around the player"""
+    import os, tempfile
+    import streaming
+    print "streaming: start time, hexes and monsters loaded, steps/s"
+    print "  {0:<18} {1:>9} {2:>8} {3:>8} {4:>9}".format(
+        "level","start","hexes","monsters","steps")
+    for size in sizes:
+        level = levelfile.Level(crowded_level(size * size,1,size))
+        fd,fname = tempfile.mkstemp(".lev")
+        os.close(fd)
+        try:
+            level.save(fname)
+            results = []
+            t0 = default_timer()
+            w = world.World(levelfile.load_level(fname),seed=1)
+            results.append(("whole",default_timer() - t0,w))
+            level.save_chunks(fname)
+            t0 = default_timer()
+            chunks = levelfile.open_chunks(fname)
+            w = world.World(chunks.level(),seed=1,
+                            stream=streaming.LevelStream(chunks))
+            results.append(("streamed",default_timer() - t0,w))
+            for name,start,w in results:
+                t0 = default_timer()
+                for t in range(ticks):
+                    w.step(ms)
+                secs = default_timer() - t0
+                print "  {0:<18} {1:>8.3f}s {2:>8} {3:>8} {4:>9.0f}".format(
+                    "{0}x{0} {1}".format(size,name),start,
+                    len(w.level.hexes),len(w.monsters),ticks / secs)
+            chunks.close()
+        finally:
+            os.remove(fname)
+
+def bench_raycast(rays=5000,length=12.0):
+    """raycast() one ray at a time against raycast_array() for all
+    of them at once, on rays from random points on each level"""
+    import raycast
+    print "raycast: {0} rays of length {1} on each level".format(
+        rays,length)
+    rng = random.Random(1)
+    for fname in LEVELS:
+        level = levelfile.load_level(fname)
+        if not level:
+            continue
+        c0,r0 = level.grid_origin
+        w,h = level.grid_size
+        x0 = [rng.uniform(c0 * 1.5,(c0 + w) * 1.5) for i in range(rays)]
+        y0 = [rng.uniform(r0 * 1.7,(r0 + h) * 1.7) for i in range(rays)]
+        a = [rng.uniform(0,2 * math.pi) for i in range(rays)]
+        x1 = [x + length * math.cos(t) for x,t in zip(x0,a)]
+        y1 = [y + length * math.sin(t) for y,t in zip(y0,a)]
+        def one_at_a_time():
+            for ray in zip(x0,y0,x1,y1):
+                raycast.raycast(level,*ray)
+        def all_at_once():
+            raycast.raycast_array(level,x0,y0,x1,y1)
+        print " ",fname
+        base = timed(one_at_a_time,1)
+        report("raycast()",rays,base)
+        if raycast.numpy is not None:
+            report("raycast_array()",rays,timed(all_at_once),base)
+
+def fov_mistakes(level,col,row,radius):
+    """Hexagons within radius of col,row that fov.shadowcast() and
+    raycast.raycast() from centre to centre disagree about, leaving
+    out lines that just touch a corner of a solid hexagon (which fov
+    counts as blocked, and raycast may or may not)"""
+    import fov, raycast
+    visible = fov.shadowcast(level,col,row,radius)
+    x0,y0 = hexgrid.hex_centre(col,row)
+    solid = [cell for cell in hexgrid.spiral(col,row,radius)
+             if level.is_solid(*cell)]
+    def touches_corner(cell,x1,y1):
+        dx,dy = x1 - x0,y1 - y0
+        for hc,hr in solid:
+            if (hc,hr) == cell:
+                continue
+            hx,hy = hexgrid.hex_centre(hc,hr)
+            for cx,cy in fov.CORNERS:
+                px,py = hx + cx - x0,hy + cy - y0
+                t = max(0.0,min(1.0,(px * dx + py * dy) /
+                                (dx * dx + dy * dy)))
+                if math.hypot(px - t * dx,py - t * dy) < 1e-6:
+                    return True
+        return False
+    mistakes = []
+    for cell in hexgrid.spiral(col,row,radius):
+        if cell == (col,row):
+            continue
+        x1,y1 = hexgrid.hex_centre(*cell)
+        hit = raycast.raycast(level,x0,y0,x1,y1)
+        clear = hit is None or hit[0] == cell
+        if clear != (cell in visible):
+            if not (clear and touches_corner(cell,x1,y1)):
+                mistakes.append(cell)
+    return mistakes
+
+def bench_fov(steps=2000,stay=10):
+    """Working out the player's field of view every step against
+    fov.FieldOfView, which only does it when the player moves to
+    another hexagon, on a random walk that stays about stay steps
+    in each hexagon"""
+    import fov
+    print "fov: {0} steps on each level".format(steps)
+    rng = random.Random(1)
+    for fname in LEVELS:
+        level = levelfile.load_level(fname)
+        if not level:
+            continue
+        here = level.start
+        walk = []
+        while len(walk) < steps:
+            walk.extend([here] * stay)
+            there = hexgrid.neighbour(here[0],here[1],rng.randrange(6))
+            if not level.is_solid(*there):
+                here = there
+        walk = walk[:steps]
+        radius = fov.FieldOfView.radius
+        def every_step():
+            for col,row in walk:
+                fov.shadowcast(level,col,row,radius)
+        sight = fov.FieldOfView(level)
+        def cached():
+            sight.forget()
+            for col,row in walk:
+                sight.look_from(col,row)
+        print " ",fname
+        base = timed(every_step,1)
+        report("shadowcast() every step",steps,base)
+        report("FieldOfView.look_from()",steps,timed(cached),base)
+        places = sorted(set(walk))[::10]
+        wrong = sum(len(fov_mistakes(level,col,row,radius))
+                    for col,row in places)
+        print "  {0} places checked against raycast(): {1} wrong".format(
+            len(places),wrong)
+
+def bench_env(num_envs=16,steps=200):
+    """env.MultiEnv stepping many games with random actions
+    (needs numpy)"""
+    import numpy, env
+    e = env.MultiEnv(num_envs,seed=1)
+    e.reset()
+    rng = numpy.random.RandomState(1)
+    t0 = default_timer()
+    for i in range(steps):
+        actions = numpy.zeros((num_envs,2),int)
+        actions[:,0] = rng.randint(0,7,num_envs)
+        actions[:,1] = rng.randint(0,13,num_envs) * (rng.rand(num_envs) < 0.1)
+        e.step(actions)
+    secs = default_timer() - t0
+    print "env: {0} games, {1} steps of {2} x {3}ms".format(
+        num_envs,steps,e.frame_skip,e.ms)
+    report("MultiEnv.step() per game",steps * num_envs,secs)
+    report("World.step()",steps * num_envs * e.frame_skip,secs)
+
+def bench_flowfield():
+    """FlowField rebuilds, incremental updates when hexes are
+    destroyed, and downhill() lookups"""
+    print "flowfield: per level, in microseconds"
+    print "  {0:<12} {1:>10} {2:>10} {3:>10}".format(
+        "level","rebuild","destroy","downhill")
+    rng = random.Random(1)
+    for fname in LEVELS:
+        level = levelfile.load_level(fname)
+        if not level:
+            continue
+        flow = flowfield.FlowField(level)
+        flow.set_target(*level.start)
+        rebuild = timed(flow.rebuild)
+        hexes = sorted(c for c,code in level.hexes.items()
+                       if level.hexpoints(code))
+        rng.shuffle(hexes)
+        hexes = hexes[:20]
+        def destroy():
+            for hc,hr in hexes:
+                level.destroy(hc,hr)
+                flow.cell_changed(hc,hr)
+        destroy_secs = timed(destroy,1) / max(len(hexes),1)
+        cells = sorted(level.hexes)
+        def lookups():
+            for hc,hr in cells:
+                flow.downhill(hc,hr)
+        downhill = timed(lookups) / len(cells)
+        print "  {0:<12} {1:>10.1f} {2:>10.1f} {3:>10.1f}".format(
+            fname,rebuild * 1e6,destroy_secs * 1e6,downhill * 1e6)
+
+def big_level(cols=160,rows=160,seed=1):
+    """A random level much bigger than any of the real ones"""
+    rng = random.Random(seed)
+    hexes = {}
+    for hc in range(cols):
+        for hr in range(rows):
+            x = rng.random()
+            if x < 0.15:
+                hexes[hc,hr] = "#"
+            elif x < 0.35:
+                hexes[hc,hr] = "H888"
+    return levelfile.Level(dict(hexes=hexes,start=(1,1),
+                                exit=(cols - 2,rows - 2)))
+
+def bench_pathindex(queries=200,destroy=50):
+    """PathIndex build, path queries and repairs on a big level,
+    against a flow field rebuild for each goal.  next_step() is asked
+    the way to one goal from every start, first for a goal it hasn't
+    seen and then again, as when many monsters follow the player."""
+    level = big_level()
+    rng = random.Random(1)
+    (c0,r0),(w,h) = level.grid_origin,level.grid_size
+    print "pathindex: {0} x {1} cells".format(w,h)
+    t0 = default_timer()
+    paths = pathindex.PathIndex(level)
+    report("PathIndex build",1,default_timer() - t0)
+    free = [(hc,hr) for hc in range(c0,c0 + w) for hr in range(r0,r0 + h)
+            if not level.is_solid(hc,hr)]
+    trips = [(rng.choice(free),rng.choice(free)) for i in range(queries)]
+    def path():
+        for start,goal in trips:
+            paths.path(start,goal)
+    report("PathIndex.path()",queries,timed(path,1))
+    goal = trips[0][1]
+    def next_step():
+        for start,g in trips:
+            paths.next_step(start,goal)
+    report("next_step(), new goal",queries,timed(next_step,1))
+    report("next_step(), same goal",queries,timed(next_step))
+    flow = flowfield.FlowField(level)
+    def flows():
+        for start,goal in trips[:10]:
+            flow.set_target(*goal)
+            flow.downhill(*start)
+    report("FlowField per goal",10,timed(flows,1))
+    hexes = sorted(c for c,code in level.hexes.items()
+                   if level.hexpoints(code))
+    hexes = rng.sample(hexes,destroy)
+    def repair():
+        for hc,hr in hexes:
+            level.destroy(hc,hr)
+            paths.cell_changed(hc,hr)
+    report("PathIndex.cell_changed()",destroy,timed(repair,1))
+
+def count_allocations(fn):
+    """Number of Vecs made by fn(), whether by Vec() or by
+    Vec arithmetic"""
+    made = [0]
+    new,init = vec._new,vec.Vec.__dict__["__init__"]
+    def counting_new(cls):
+        made[0] += 1
+        return new(cls)
+    def counting_init(self,*args):
+        made[0] += 1
+        init(self,*args)
+    vec._new,vec.Vec.__init__ = counting_new,counting_init
+    try:
+        fn()
+    finally:
+        vec._new,vec.Vec.__init__ = new,init
+    return made[0]
+
+def bench_vec(count=100000,batch=1000):
+    """Vec and Vec2 arithmetic, in place and not, the VecPool, and
+    the numpy functions against a loop over Vecs"""
+    print "vec: {0} of each operation".format(count)
+    print "  {0:<28} {1:>12}     {2:>6}".format("","","allocs")
+    a,b = Vec(1.5,-2.0,0.25),Vec(0.5,3.0,-1.0)
+    a2,b2 = vec.Vec2(1.5,-2.0),vec.Vec2(0.5,3.0)
+    pool = vec.VecPool(16)
+    def pooled(a,b):
+        v = pool.get(a.x,a.y,a.z)
+        pool.give_back(v)
+    ops = [
+        ("Vec(x,y,z)",lambda a,b: Vec(1.0,2.0,3.0)),
+        ("a + b",lambda a,b: a + b),
+        ("a - b",lambda a,b: a - b),
+        ("a * k",lambda a,b: a * 0.5),
+        ("-a",lambda a,b: -a),
+        ("a.dot(b)",lambda a,b: a.dot(b)),
+        ("a.length()",lambda a,b: a.length()),
+        ("a.normalise()",lambda a,b: a.normalise()),
+        ("a.cross(b)",lambda a,b: a.cross(b)),
+        ("VecPool get/give_back",pooled),
+        ]
+    for name,op in ops:
+        def run():
+            for i in xrange(count):
+                op(a,b)
+        made = count_allocations(lambda: op(a,b))
+        print "  {0:<28} {1:>12.0f} /s  {2:>6}".format(
+            name,count / timed(run),made)
+    def in_place(name,op,v,w):
+        def run():
+            for i in xrange(count):
+                op(v,w)
+        made = count_allocations(lambda: op(v,w))
+        print "  {0:<28} {1:>12.0f} /s  {2:>6}".format(
+            name,count / timed(run),made)
+    def iadd(v,w):
+        v += w
+    def imul(v,w):
+        v *= 1.0
+    in_place("a += b",iadd,Vec(a),b)
+    in_place("a *= k",imul,Vec(a),b)
+    for name,op in ops[1:6]:
+        def run():
+            for i in xrange(count):
+                op(a2,b2)
+        made = count_allocations(lambda: op(a2,b2))
+        print "  {0:<28} {1:>12.0f} /s  {2:>6}".format(
+            "Vec2 " + name,count / timed(run),made)
+    in_place("Vec2 a += b",iadd,vec.Vec2(a2),b2)
+    if vec.numpy is None:
+        return
+    rng = random.Random(1)
+    vs = [Vec(rng.uniform(-1,1),rng.uniform(-1,1),rng.uniform(-1,1))
+          for i in range(batch)]
+    ws = [Vec(rng.uniform(-1,1),rng.uniform(-1,1),rng.uniform(-1,1))
+          for i in range(batch)]
+    A,B = vec.as_array(vs),vec.as_array(ws)
+    print " {0} vectors at once, as arrays".format(batch)
+    for name,loop,whole in [
+        ("lengths",lambda: [v.length() for v in vs],
+         lambda: vec.lengths(A)),
+        ("normalised",lambda: [v.normalise() for v in vs],
+         lambda: vec.normalised(A)),
+        ("dots",lambda: [v.dot(w) for v,w in zip(vs,ws)],
+         lambda: vec.dots(A,B)),
+        ("crosses",lambda: [v.cross(w) for v,w in zip(vs,ws)],
+         lambda: vec.crosses(A,B)),
+        ]:
+        base = timed(loop)
+        report(name + " loop",batch,base)
+        report(name + " array",batch,timed(whole),base)
+
+BENCHMARKS = {
+    "batch":bench_batch,
+    "collision":bench_collision,
+    "env":bench_env,
+    "flowfield":bench_flowfield,
+    "fov":bench_fov,
+    "kinetic":bench_kinetic,
+    "lod":bench_lod,
+    "neighbourhoods":bench_neighbourhoods,
+    "pathindex":bench_pathindex,
+    "raycast":bench_raycast,
+    "snapshot":bench_snapshot,
+    "store":bench_store,
+    "streaming":bench_streaming,
+    "vec":bench_vec,
+    "world":bench_world,
+    }
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or sorted(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
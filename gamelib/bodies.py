@@ -0,0 +1,368 @@
+"""
+  Bodies: the state and rules of the things that move about
+  in a level -- the player, the balls and the monsters.
+
+  Nothing in here draws anything or needs an OpenGL context.
+  The Parts in graphics.py and monsters.py are views of these,
+  and a world.World moves them about and decides what happens
+  when they bump into things.
+"""
+from math import atan2, degrees, fmod, sin, cos, radians
+import random
+from tdgl.vec import Vec
+import collision
+import hexgrid
+
+# How much attention a monster gets each step (see World.set_tiers)
+FULL, REDUCED, DORMANT = range(3)
+
+
+class Body(object):
+    """Something that moves about in a level.
+
+    Its pos, velocity, angle and time_left live in the row of an
+    entities.EntityStore while it is attached to one (store and
+    slot say where), and in the body itself otherwise."""
+    radius = 0.49
+    store = None
+    slot = None
+
+    def __init__(self, name='', pos=(0,0,0), velocity=(0,0,0), angle=0.0):
+        self.name = name
+        self.pos = Vec(pos)
+        self.velocity = Vec(velocity)
+        self.angle = angle
+        self.time_left = float('inf')
+        self.expired = False
+        self.world = None
+
+    @property
+    def pos(self):
+        s = self.store
+        if s is None:
+            return self._pos
+        i = self.slot
+        return Vec(s.x[i], s.y[i], s.z[i])
+
+    @pos.setter
+    def pos(self, v):
+        s = self.store
+        if s is None:
+            self._pos = v
+        else:
+            i = self.slot
+            s.x[i], s.y[i], s.z[i] = v
+
+    @property
+    def velocity(self):
+        s = self.store
+        if s is None:
+            return self._velocity
+        i = self.slot
+        return Vec(s.vx[i], s.vy[i], s.vz[i])
+
+    @velocity.setter
+    def velocity(self, v):
+        s = self.store
+        if s is None:
+            self._velocity = v
+        else:
+            i = self.slot
+            s.vx[i], s.vy[i], s.vz[i] = v
+            s.turned.add(i)
+
+    @property
+    def angle(self):
+        s = self.store
+        if s is None:
+            return self._angle
+        return float(s.angle[self.slot])
+
+    @angle.setter
+    def angle(self, a):
+        s = self.store
+        if s is None:
+            self._angle = a
+        else:
+            s.angle[self.slot] = a
+
+    @property
+    def time_left(self):
+        """ms until the body expires of old age"""
+        s = self.store
+        if s is None:
+            return self._time_left
+        return float(s.time_left[self.slot])
+
+    @time_left.setter
+    def time_left(self, t):
+        s = self.store
+        if s is None:
+            self._time_left = t
+        else:
+            s.time_left[self.slot] = t
+
+    @property
+    def random(self):
+        """The world's random number stream, so that replays of
+        a level go the same way every time"""
+        if self.world:
+            return self.world.random
+        return random
+
+    def sound(self, name):
+        """Make a noise, if anyone is listening"""
+        if self.world:
+            self.world.sound(name)
+
+    def step(self, ms):
+        pass
+
+    # attributes that tie a body to a world, rather than say what
+    # state it is in, and where the numbers are kept
+    unsaved = ("world", "store", "slot",
+               "_pos", "_velocity", "_angle", "_time_left")
+
+    def get_state(self):
+        """Everything about the body that changes as it moves, as a
+        dict to put back later with set_state()"""
+        unsaved = self.unsaved
+        state = dict((k, v) for k, v in self.__dict__.items()
+                     if k not in unsaved)
+        state["pos"] = Vec(self.pos)
+        state["velocity"] = Vec(self.velocity)
+        state["angle"] = self.angle
+        state["time_left"] = self.time_left
+        return state
+
+    def set_state(self, state):
+        """Put the body back as it was when state was got"""
+        state = dict(state)
+        self.pos = Vec(state.pop("pos"))
+        self.velocity = Vec(state.pop("velocity"))
+        self.angle = state.pop("angle")
+        self.time_left = state.pop("time_left")
+        self.__dict__.update(state)
+
+
+class Player(Body):
+    """ The detective """
+    radius = 0.49
+
+
+class Ball(Body):
+    """ A demolition ball """
+    radius = 0.2
+    lethal = True
+    speed = 0.01
+    duration = 6000
+    maxdestroy = 4
+    bounces = True
+    ammo = 1
+
+    def __init__(self, name='', direction=None, **kw):
+        super(Ball, self).__init__(name, **kw)
+        if direction:
+            self.velocity = Vec(direction).normalise() * self.speed
+        else:
+            self.velocity = Vec(0,0,0)
+        self.time_left = self.duration
+
+    def step(self, ms):
+        self.time_left = self.time_left - ms
+        if self.time_left < 0:
+            self.expired = True
+
+class BlitzBall(Ball):
+    duration = 1000
+    speed = 0.018
+    ammo = 5
+
+class BowlingBall(Ball):
+    radius = 0.4
+    speed = 0.005
+    duration = 10000
+    maxdestroy = 8
+    ammo = 3
+
+class HappyBall(Ball):
+    lethal = False
+    maxdestroy = float('inf')
+    duration = float('inf')
+    ammo = 1
+
+class SpikeBall(Ball):
+    maxdestroy = 10
+    bounces = False
+    duration = 8000
+    ammo = 4
+
+class DeathBall(Ball):
+    maxdestroy = 13
+    duration = 10000
+    ammo = 3
+    speed = 0.016
+
+
+class Monster(Body):
+    """ A Monster """
+    radius = 0.49
+    harm_type = "monsterated by a"
+    speed = 1.0
+    follows_player = False # steer() each step, down the flow field
+    tier = FULL
+    owed = 0 # ms not yet moved, while REDUCED
+
+    def turn_to(self, v):
+        """ Turn to face direction of new velocity vector """
+        self.angle = degrees(atan2(v.y,v.x))
+        self.velocity = v
+
+    def on_collision(self,what,where,direction):
+        """Decide what to do after a collision
+        (change direction, die etc.)"""
+        self.pos = where
+        self.turn_to(direction)
+
+class Shuttler(Monster):
+    """On any collision, just reverse direction"""
+    def on_collision(self,what,where,direction):
+        self.angle = fmod(self.angle + 180,360)
+        self.velocity *= -1
+        self.pos = where
+
+class Squashy(Monster):
+    speed = 0.6
+    harm_type = "contaminated by a"
+    def on_collision(self,what,where,direction):
+        """ On collision with a ball, die"""
+        if isinstance(what,Ball):
+            self.expired = True
+            self.sound("squelch")
+        else:
+            self.turn_to(direction)
+            self.pos = where
+
+class Wanderer(Monster):
+    radius = 0.3
+    speed = 0.8
+
+    def on_collision(self,what,where,direction):
+        """ On collision with a ball, pick a random
+        direction and speed"""
+        if isinstance(what,Ball):
+            r = self.velocity.length()
+            if r < 0.001 or r > 0.04:
+                r = 0.01
+            r *= self.random.gauss(1.0,0.05)
+            self.angle = self.random.random() * 360
+            a = radians(self.angle)
+            self.velocity = Vec(cos(a),sin(a)) * r
+            self.sound("chime")
+        else:
+            self.turn_to(direction)
+        self.pos = where
+
+class Hunter(Monster):
+    """ On collision with a ball, follow the track
+    of the ball back towards the player!"""
+    def hunt(self,what,where,factor=1.0):
+        self.turn_to(what.velocity * -factor)
+        self.pos = what.pos
+        # Eat the ball!
+        what.expired = True
+
+    def eat(self,what,direction):
+        self.turn_to(direction)
+        self.velocity = Vec(0,0,0)
+
+    def on_collision(self,what,where,direction):
+        if isinstance(what,Ball):
+            self.harm_type = "provoked a"
+            self.sound("roar")
+            self.hunt(what,where)
+        elif isinstance(what,Player):
+            self.eat(what,direction)
+            self.sound("munch")
+        else:
+            self.turn_to(direction)
+            self.pos = where
+
+class Mimic(Hunter):
+    """ Hides until hit, then goes on a short rampage,
+    then goes back into hiding"""
+    def __init__(self,name='',**kw):
+        self.hiding = True
+        self.rage = 0
+        super(Mimic,self).__init__(name,**kw)
+        self.velocity = Vec(0,0,0)
+
+    def enrage(self):
+        self.rage = 10
+        self.hiding = False
+
+    def on_collision(self,what,where,direction):
+        if isinstance(what,Ball):
+            self.hunt(what,where,1.1)
+            self.harm_type = "provoked a"
+            self.sound("roar")
+            self.enrage()
+        elif isinstance(what,Player):
+            self.eat(what,direction)
+            self.sound("munch")
+        else:
+            self.turn_to(direction)
+            self.pos = where
+            self.rage -= 1
+            if self.rage <= 0:
+                self.hiding = True
+                x,y,_ = where
+                hc,hr = hexgrid.pixel_to_hex(x,y)
+                self.pos = collision.h_centre(hc,hr)
+                self.velocity = Vec(0,0,0)
+
+class Balrog(Hunter):
+    radius = 0.4
+    speed = 0.5
+    """ Like a Hunter, but finds its way round the walls
+    towards the player, down the world's flow field """
+    player = None
+    follows_player = True
+    cell = None
+
+    def steer(self,flow):
+        """ Each time we get to a new cell, head for the
+        next cell on the way to the player """
+        x,y,z = self.pos
+        cell = hexgrid.pixel_to_hex(x,y)
+        if cell == self.cell:
+            return
+        self.cell = cell
+        r = self.velocity.length()
+        direction = flow.direction_from(x,y)
+        if r and direction:
+            self.turn_to(direction * r)
+
+    def on_collision(self,what,where,direction):
+        if isinstance(what,Ball):
+            self.harm_type = "provoked the"
+            self.sound("rumble")
+            self.hunt(what,where,0.9)
+        elif isinstance(what,Player):
+            self.eat(what,direction)
+            self.sound("bellow")
+        else:
+            r = self.velocity.length()
+            to_player = Vec(self.player.pos) - self.pos
+            flow = self.world and self.world.flow
+            towards = flow and flow.direction_from(where.x,where.y)
+            if towards:
+                # the way round the walls to the player
+                direction = towards * r
+            elif to_player.dot(direction) > 0:
+                # facing towards player...
+                direction = to_player.normalise() * r
+                if self.random.random < 0.2:
+                    self.sound("rumble")
+            self.pos = where
+            self.turn_to(direction)
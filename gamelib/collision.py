@@ -34,11 +34,25 @@
 
  All tests are begun by transforming the circle's position
  so the centre of the hexagon is at the origin.
+
+ collides_batch() runs the same tests for many circles at once
+ against the solid hexagons of a level, using numpy arrays and the
+ level's solidity grid if numpy is installed.
+
+ For fast projectiles, sweep() drops the low-speed assumption:
+ it finds the exact time of impact of the moving circle against
+ the sides and corners of each hexagon, and follows the circle
+ through as many contacts as it makes in one step.
 """
 
-from tdgl.vec import Vec
+from tdgl.vec import Vec, Vec2, as_array
+
+from math import sin,cos,acos,asin,sqrt
 
-from math import sin,cos,acos,asin
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 R3 = 3.0**0.5
 Sin60 = R3*0.5
@@ -105,60 +119,347 @@ COLLIDE_CIRCLE = 1
 COLLIDE_POSITION = 2
 COLLIDE_REBOUND = 3
  
-def collides(hcol,hrow,C,r,v=Vec(0,0),detail=COLLIDE_BBOX,debug=False):
-    """ Collision test:
+# Side normals as plain (x,y,x*x+y*y) tuples for collides_xy()
+H_NORMAL_XY = tuple((n.x,n.y,n.x*n.x + n.y*n.y) for n in H_NORMAL)
+
+def collides_xy(hcol,hrow,cx,cy,r,vx=0.0,vy=0.0,detail=COLLIDE_BBOX):
+    """ Collision test in the XY plane on plain floats,
+    without making any Vec objects:
     hcol,hrow : hexagon grid coordinates
-    C : circle centre
+    cx,cy : circle centre
     r : circle radius
-    v : circle velocity vector
+    vx,vy : circle velocity vector
     detail: level of collision detail required (see module doc)
+
+    Return False, True, (x,y) or ((x,y),(vx,vy)) depending
+    on detail.
     """
-    H = h_centre(hcol,hrow)
-    v = Vec(v)
-    C0 = Vec(C) - H
-    C1 = C0 + v
-    left,right = C1.x - r, C1.x + r
-    top,bot = C1.y + r, C1.y - r
-    bbtest = left < 1 and right > -1 and bot < 1 and top > -1
-    if not bbtest:
+    hx = hcol * 1.5
+    hy = hrow * R3 + Sin60 * (hcol % 2)
+    x0,y0 = cx - hx, cy - hy
+    x1,y1 = x0 + vx, y0 + vy
+    if not (x1 - r < 1 and x1 + r > -1 and y1 - r < 1 and y1 + r > -1):
         return False
     if detail == COLLIDE_BBOX:
         return True
-    
-    circletest = C1.length() < (1 + r)
-    if not circletest:
+
+    d = sqrt(x1*x1 + y1*y1)
+    if not d < (1 + r):
         return False
     if detail == COLLIDE_CIRCLE:
         return True
 
     # Push the circle away past the edge of the bounding
     # circle of the hexagon
-    n = C1.normalise()
-    C2 = n * (1+r)
-    
+    if d:
+        nx,ny = x1 / d, y1 / d
+    else:
+        nx = ny = 0.0
+    x2,y2 = nx * (1+r), ny * (1+r)
 
     if detail == COLLIDE_POSITION:
-        return C2 + H
+        return x2 + hx, y2 + hy
 
     # Find hexagon normal nearest to the direction of the circle
-    nx,ny,_ = n
-    dots = sorted((v.dot(n),i)
-                   for (i,v) in enumerate(H_NORMAL))
-    _,i = dots[-1]
-    # Real normal at hexagon side...
-    n = H_NORMAL[i]
-    # Calculate bounce vector...
+    best = None
+    for sx,sy,ss in H_NORMAL_XY:
+        dot = sx*nx + sy*ny
+        if best is None or dot >= best:
+            best = dot
+            snx,sny,snn = sx,sy,ss
 
     # Portion of intended distance still to travel
-    speed = v.length()
-    v1 = C2 - C0
-    remainder = max(0.01,speed - v1.length())
+    speed = sqrt(vx*vx + vy*vy)
+    v1x,v1y = x2 - x0, y2 - y0
+    remainder = max(0.01,speed - sqrt(v1x*v1x + v1y*v1y))
     # Midpoint M is above the collision point
-    M = C2 - v1.proj(n)
+    k = (v1x*snx + v1y*sny) / snn
+    mx,my = x2 - snx*k, y2 - sny*k
     # C3 is opposite C0 through the midpoint M
-    C3 = C0 + (M - C0)*2
+    x3,y3 = x0 + (mx - x0)*2, y0 + (my - y0)*2
     # Direction
-    v2 = (C3 - C2).normalise()
-    C2 += v2 * remainder
-    return C2 + H, v2 * speed
+    v2x,v2y = x3 - x2, y3 - y2
+    d = sqrt(v2x*v2x + v2y*v2y)
+    if d:
+        v2x,v2y = v2x / d, v2y / d
+    else:
+        v2x = v2y = 0.0
+    return ((x2 + v2x*remainder + hx, y2 + v2y*remainder + hy),
+            (v2x*speed, v2y*speed))
+
+def _xy(v):
+    """x,y of a Vec or tuple"""
+    i = iter(v)
+    return next(i), next(i)
+
+def _vec_result(P,detail):
+    """Turn a collides_xy() result into Vecs"""
+    if not P or detail < COLLIDE_POSITION:
+        return P
+    if detail == COLLIDE_POSITION:
+        return Vec2(*P)
+    return Vec2(*P[0]), Vec2(*P[1])
+
+def collides(hcol,hrow,C,r,v=Vec(0,0),detail=COLLIDE_BBOX,debug=False):
+    """ Collision test:
+    hcol,hrow : hexagon grid coordinates
+    C : circle centre
+    r : circle radius
+    v : circle velocity vector
+    detail: level of collision detail required (see module doc)
 
+    Positions and vectors are returned as Vecs.
+    """
+    cx,cy = _xy(C)
+    vx,vy = _xy(v)
+    return _vec_result(collides_xy(hcol,hrow,cx,cy,r,vx,vy,detail),detail)
+
+
+# Fewer circles than this are quicker one at a time (see bench.py batch)
+BATCH_MIN = 12
+
+def collides_batch(level,centres,radii,velocities,
+                   detail=COLLIDE_REBOUND,d=2):
+    """ Collision test for many circles at once:
+    level : the levelfile.Level whose solid hexagons are obstacles
+    centres : circle centres
+    radii : circle radii
+    velocities : circle velocity vectors
+    detail: COLLIDE_POSITION or COLLIDE_REBOUND
+    d : grid distance to look for obstacles, as in obstacles_near()
+
+    Return a list with one (obstacle, result) pair for each circle,
+    where obstacle is the (hcol,hrow,cellcode) that collides_first()
+    would choose from level.obstacles_near(), and result is what
+    collides() would return for that hexagon.
+    (None, False) means no collision.
+
+    With numpy, the hexagons near every circle are looked up in the
+    level's solidity grid and tested all at once; otherwise (or for
+    fewer than BATCH_MIN circles) each circle goes through
+    collides_first().
+    """
+    if numpy is None or len(centres) < BATCH_MIN:
+        results = []
+        for C,r,v in zip(centres,radii,velocities):
+            cx,cy = _xy(C)
+            obs = level.obstacles_near(cx,cy,d)
+            k,P = collides_first(obs,C,r,v,detail)
+            results.append((obs[k] if P else None,P))
+        return results
+    return _collides_batch_numpy(level,centres,radii,velocities,detail,d)
+
+def obstacle_order(obs,cx,cy):
+    """Sort key of a (hcol,hrow,...) obstacle near cx,cy: nearest
+    centre first, then by column and row.  When a circle at cx,cy
+    hits several hexagons at once, the first in this order counts."""
+    hc,hr = obs[0],obs[1]
+    hx = hc * 1.5
+    hy = hr * R3 + Sin60 * (hc % 2)
+    return sqrt((hx - cx) ** 2 + (hy - cy) ** 2),hc,hr
+
+def collides_first(obstacles,C,r,v=Vec(0,0),detail=COLLIDE_REBOUND):
+    """ Test a circle against a list of (hcol,hrow,...) obstacles,
+    returning (k, result) for the one it collides with that comes
+    first in obstacle_order() from C, or (None, False) """
+    cx,cy = _xy(C)
+    vx,vy = _xy(v)
+    found = None
+    for k,obs in enumerate(obstacles):
+        P = collides_xy(obs[0],obs[1],cx,cy,r,vx,vy,detail)
+        if P:
+            key = obstacle_order(obs,cx,cy)
+            if found is None or key < found[0]:
+                found = key,k,P
+    if found is None:
+        return None,False
+    key,k,P = found
+    return k,_vec_result(P,detail)
+
+def _dot3(a,b):
+    """Row-wise dot product, summed in the same order as Vec.dot"""
+    return a[...,0]*b[...,0] + a[...,1]*b[...,1] + a[...,2]*b[...,2]
+
+def _collides_batch_numpy(level,centres,radii,velocities,detail,d):
+    N = len(centres)
+    results = [(None,False)] * N
+    C = as_array(centres)
+    V = as_array(velocities)
+    r = numpy.array(radii,dtype=float)
+    # The hexagon nearest each centre, as in Level.obstacles_near(),
+    # and the square of hexagons round it in (hcol,hrow) order
+    hcol = (C[:,0] / 1.5 + 0.5).astype(int)
+    hrow = ((C[:,1] - Sin60 * (hcol % 2)) / R3 + 0.5).astype(int)
+    steps = numpy.arange(-d,d + 1)
+    hc = hcol[:,None] + numpy.repeat(steps,len(steps))
+    hr = hrow[:,None] + numpy.tile(steps,len(steps))
+    # which of them are solid, from the level's grid
+    c0,r0 = level.grid_origin
+    w,h = level.grid_size
+    u,v = hc - c0,hr - r0
+    valid = (u >= 0) & (u < w) & (v >= 0) & (v < h)
+    solid = numpy.frombuffer(level.solid,numpy.uint8)
+    valid &= solid[numpy.where(valid,u * h + v,0)] == 1
+    H = numpy.zeros(hc.shape + (3,))
+    H[:,:,0] = hc * 1.5
+    H[:,:,1] = hr * R3 + Sin60 * (hc % 2)
+    C0 = C[:,None,:] - H
+    C1 = C0 + V[:,None,:]
+    rk = r[:,None]
+    hit = (valid &
+           (C1[:,:,0] - rk < 1) & (C1[:,:,0] + rk > -1) &
+           (C1[:,:,1] - rk < 1) & (C1[:,:,1] + rk > -1))
+    length = numpy.sqrt(_dot3(C1,C1))
+    hit &= length < (1 + rk)
+    rows = numpy.nonzero(hit.any(axis=1))[0]
+    if not len(rows):
+        return results
+    # The square is in (hcol,hrow) order, so the first of the nearest
+    # hexagons hit is the first in obstacle_order()
+    dx = C0[rows,:,0]
+    dy = C0[rows,:,1]
+    far = numpy.where(hit[rows],numpy.sqrt(dx ** 2 + dy ** 2),numpy.inf)
+    ks = far.argmin(axis=1)
+    hexes = level.hexes
+    found = [(c,rr,hexes[c,rr]) for c,rr in
+             zip(hc[rows,ks].tolist(),hr[rows,ks].tolist())]
+    # Only the first hexagon hit by each circle matters from here on
+    H = H[rows,ks]
+    C0 = C0[rows,ks]
+    C1 = C1[rows,ks]
+    d = length[rows,ks][:,None]
+    r = r[rows][:,None]
+    n = numpy.where(d > 0, C1 / numpy.where(d > 0, d, 1), 0.0)
+    C2 = n * (1 + r)
+    if detail == COLLIDE_POSITION:
+        for i,obs,P in zip(rows,found,C2 + H):
+            results[i] = (obs,Vec(*P))
+        return results
+    # Hexagon normal nearest to the direction of the circle
+    # (ties go to the last side, as in collides())
+    normals = numpy.array([tuple(hn) for hn in H_NORMAL])
+    dots = _dot3(n[:,None,:],normals[None,:,:])
+    side = 5 - dots[:,::-1].argmax(axis=1)
+    hn = normals[side]
+    v = V[rows]
+    speed = numpy.sqrt(_dot3(v,v))[:,None]
+    v1 = C2 - C0
+    v1len = numpy.sqrt(_dot3(v1,v1))[:,None]
+    remainder = numpy.maximum(0.01,speed - v1len)
+    M = C2 - hn * (_dot3(v1,hn) / _dot3(hn,hn))[:,None]
+    C3 = C0 + (M - C0) * 2
+    v2 = C3 - C2
+    v2len = numpy.sqrt(_dot3(v2,v2))[:,None]
+    v2 = numpy.where(v2len > 0, v2 / numpy.where(v2len > 0, v2len, 1), 0.0)
+    C2 = C2 + v2 * remainder
+    for i,obs,P,B in zip(rows,found,C2 + H,v2 * speed):
+        results[i] = (obs,(Vec(*P),Vec(*B)))
+    return results
+
+# Exact swept collisions
+SWEEP_EPSILON = 1e-9
+
+def sweep_reach(v,r):
+    """Hex grid distance to search for obstacles to a circle of
+    radius r moving by velocity vector v in one step"""
+    return int((v.length() + r + 1) / 1.5) + 1
+
+def _sweep_hexagon(cx,cy,vx,vy,r):
+    """Earliest time 0 <= t <= 1 at which a circle of radius r,
+    centred at cx,cy relative to the hexagon centre and moving by
+    vx,vy, touches the hexagon.
+    Return (t,nx,ny) where nx,ny is the unit normal out of the
+    hexagon at the point of contact, or None if it doesn't touch."""
+    best = None
+    for i in range(6):
+        nx,ny,_ = H_NORMAL[i]
+        kx,ky,_ = H_CORNER[i]
+        # Side: the circle must be approaching it
+        dv = nx*vx + ny*vy
+        if dv < 0:
+            dist = nx*(cx - kx) + ny*(cy - ky)
+            if dist >= r - SWEEP_EPSILON:
+                t = max(0.0,(r - dist) / dv)
+                if t <= 1 and (best is None or t < best[0]):
+                    sx,sy,_ = H_SIDE[i]
+                    along = ((cx + vx*t - kx)*sx +
+                             (cy + vy*t - ky)*sy)
+                    if 0 <= along <= 1:
+                        best = (t,nx,ny)
+        # Corner: solve |(C - K) + t*v| = r
+        dx,dy = cx - kx, cy - ky
+        b = dx*vx + dy*vy
+        if b >= 0:
+            continue # moving away from the corner
+        a = vx*vx + vy*vy
+        c = dx*dx + dy*dy - r*r
+        if c < -SWEEP_EPSILON * r:
+            continue # inside the corner circle: the sides deal with it
+        disc = b*b - a*c
+        if disc < 0:
+            continue
+        t = max(0.0,(-b - disc**0.5) / a)
+        if t <= 1 and (best is None or t < best[0]):
+            px,py = dx + vx*t, dy + vy*t
+            d = (px*px + py*py)**0.5
+            best = (t,px/d,py/d)
+    return best
+
+def sweep(obstacles,C,r,v,max_contacts=4,slide=False,on_contact=None):
+    """ Move a circle of radius r from C by velocity vector v,
+    stopping exactly where it touches any of the obstacles
+    ((hcol,hrow,...) tuples) and rebounding (or sliding along the
+    surface if slide is true) for the rest of the step.
+
+    on_contact(obstacle,position,normal) is called at each contact.
+    If it returns a false value the circle passes on through
+    that obstacle (because it has been destroyed, say).
+
+    After max_contacts contacts the circle stops where it is.
+    Obstacles touched at the same moment are taken in
+    obstacle_order() from C.
+
+    Return (position, velocity, contacts) where velocity is v
+    turned by the contacts and contacts is a list of
+    (obstacle,position,normal).
+    """
+    x,y,z = Vec(C)
+    x0,y0 = x,y
+    vx,vy,_ = Vec(v)
+    ux,uy = vx,vy
+    live = list(obstacles)
+    contacts = []
+    while vx or vy:
+        best = None
+        for obs in live:
+            hc,hr = obs[0],obs[1]
+            hit = _sweep_hexagon(x - hc*1.5,
+                                 y - (hr*R3 + Sin60*(hc % 2)),
+                                 vx,vy,r)
+            if hit and (best is None or hit[0] < best[0][0]
+                        or (hit[0] == best[0][0] and
+                            obstacle_order(obs,x0,y0)
+                            < obstacle_order(best[1],x0,y0))):
+                best = hit,obs
+        if best is None:
+            x += vx
+            y += vy
+            break
+        (t,nx,ny),obs = best
+        x += vx*t
+        y += vy*t
+        vx *= 1 - t
+        vy *= 1 - t
+        contacts.append((obs,Vec(x,y,z),Vec(nx,ny)))
+        if on_contact and not on_contact(obs,contacts[-1][1],Vec(nx,ny)):
+            live.remove(obs)
+            continue
+        k = 1.0 if slide else 2.0
+        d = ux*nx + uy*ny
+        if d < 0:
+            ux,uy = ux - k*d*nx, uy - k*d*ny
+        if len(contacts) >= max_contacts:
+            break
+        d = vx*nx + vy*ny
+        vx,vy = vx - k*d*nx, vy - k*d*ny
+    return Vec(x,y,z), Vec(ux,uy), contacts
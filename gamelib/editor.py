@@ -15,7 +15,7 @@ import pyglet.window.key as pygkey
 from tdgl.gl import *
 from tdgl import viewpoint, lighting, part, picking, panel, stylesheet
 
-import levelfile, collision, graphics, monsters
+import levelfile, collision, graphics, monsters, hexgrid, levelcheck
 
 basic_hexes = {pygkey.SPACE:" ",
                pygkey._3:"#",
@@ -151,6 +151,8 @@ class EditorWindow(pyglet.window.Window):
     def on_key_press(self,sym,mods):
         if sym == pygkey.S and mods & pygkey.MOD_CTRL:
             self.level.save(self.fname)
+            print levelcheck.format_report(
+                self.fname,levelcheck.check_level(self.level))
         elif sym == pygkey.ESCAPE:
             self.close()
         elif sym in basic_hexes:
@@ -184,7 +186,6 @@ class EditorWindow(pyglet.window.Window):
         m = M(mname)
         m.pos = collision.h_centre(*coords)
         m.restyle(True)
-        m.duration = float('inf') # for balls
         self.parts["view"].append(m)
 
     def place_monster(self,coords,monstername):
@@ -214,30 +215,30 @@ class EditorWindow(pyglet.window.Window):
         if button != 1: return
         fx = x/768.0 * 40
         fy = y/768.0 * 40
-        coords = collision.nearest_neighbours(fx,fy,0).next()
+        coords = hexgrid.pixel_to_hex(fx,fy)
         level = self.level
         if self.cellcode == "S":
-            level.hexes[level.start] = " "
+            level[level.start] = " "
             level.start = coords
-            level.hexes[coords] = "S"
+            level[coords] = "S"
         elif self.cellcode == "X":
-            level.hexes[level.exit] = " "
+            level[level.exit] = " "
             level.exit = coords
-            level.hexes[coords] = "X"
+            level[coords] = "X"
         elif self.cellcode is None:
             if (coords not in [level.start,level.exit]
                 and coords in level.hexes):
-                del level.hexes[coords]
+                del level[coords]
             self.unplace(coords)
         elif self.cellcode in self.monster_list:
             self.place_monster(coords,self.cellcode)
         elif self.cellcode in self.balls_list:
             self.place_powerup(coords,self.cellcode)
-            level.hexes[coords] = "P"
+            level[coords] = "P"
         elif self.cellcode in ["Au","Ag","Cu","Pt"]:
-            level.hexes[coords] = self.cellcode
+            level[coords] = self.cellcode
         else:
-            level.hexes[coords] = self.cellcode
+            level[coords] = self.cellcode
         self.hexfield.build_dl()
         self.hexfield.prepare()
 
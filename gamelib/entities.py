@@ -0,0 +1,117 @@
+"""
+ Entity store: the numbers of every body in a World, in arrays
+
+ An EntityStore holds the position, velocity, angle, radius, time
+ left to live and kind of each body attached to it, one row per
+ body, in numpy arrays (a column per number).  While a body is
+ attached, its pos, velocity, angle and time_left properties (see
+ bodies.Body) read and write its row, so the rules in bodies.py
+ work just the same, and the Parts that draw the bodies read the
+ same numbers.
+
+ The World can then work on all the bodies at once: moving the
+ monsters that aren't near anything, ageing the balls, and finding
+ which monsters overlap a ball or the player, are each a few
+ array operations instead of a loop over the bodies.
+
+ Needs numpy; without it, a World keeps its numbers in its bodies.
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+COLUMNS = ("x","y","z","vx","vy","vz","angle","radius","time_left")
+
+class EntityStore(object):
+    def __init__(self,capacity=64):
+        self.bodies = [] # body in each slot, or None
+        self.free = []
+        self.kinds = [] # classes of bodies; kind is an index in here
+        self.turned = set() # rows whose velocity has been set
+        self.capacity = 0
+        for name in COLUMNS:
+            setattr(self,name,numpy.zeros(0))
+        self.kind = numpy.zeros(0,numpy.int16)
+        self.grow(capacity)
+
+    def grow(self,capacity):
+        """Make room for capacity bodies"""
+        extra = capacity - self.capacity
+        if extra <= 0:
+            return
+        for name in COLUMNS:
+            setattr(self,name,numpy.concatenate(
+                    [getattr(self,name),numpy.zeros(extra)]))
+        self.kind = numpy.concatenate(
+            [self.kind,-numpy.ones(extra,numpy.int16)])
+        self.free.extend(range(capacity - 1,self.capacity - 1,-1))
+        self.bodies.extend([None] * extra)
+        self.capacity = capacity
+
+    def kind_of(self,cls):
+        if cls not in self.kinds:
+            self.kinds.append(cls)
+        return self.kinds.index(cls)
+
+    def add(self,body):
+        """Attach a body, moving its numbers into a free row"""
+        if body.store is not None:
+            return
+        if not self.free:
+            self.grow(self.capacity * 2)
+        i = self.free.pop()
+        x,y,z = body._pos
+        vx,vy,vz = body._velocity
+        self.x[i],self.y[i],self.z[i] = x,y,z
+        self.vx[i],self.vy[i],self.vz[i] = vx,vy,vz
+        self.angle[i] = body._angle
+        self.radius[i] = body.radius
+        self.time_left[i] = body._time_left
+        self.kind[i] = self.kind_of(body.__class__)
+        self.bodies[i] = body
+        self.turned.add(i)
+        body.store,body.slot = self,i
+
+    def remove(self,body):
+        """Detach a body, giving it back its numbers"""
+        if body.store is not self:
+            return
+        pos,velocity = body.pos,body.velocity
+        angle,time_left = body.angle,body.time_left
+        i = body.slot
+        body.store = body.slot = None
+        body.pos,body.velocity = pos,velocity
+        body.angle,body.time_left = angle,time_left
+        self.bodies[i] = None
+        self.turned.discard(i)
+        self.kind[i] = -1
+        self.free.append(i)
+
+    def slots(self,bodies):
+        """Array of the rows of a list of attached bodies"""
+        return numpy.array([b.slot for b in bodies],int)
+
+    def advance(self,slots,ms):
+        """Move bodies along their velocities for ms (an array, one
+        time for each, or a number)"""
+        self.x[slots] += self.vx[slots] * ms
+        self.y[slots] += self.vy[slots] * ms
+        self.z[slots] += self.vz[slots] * ms
+
+    def age(self,slots,ms):
+        """Take ms off the time left of bodies.  Return the rows
+        whose time has run out"""
+        self.time_left[slots] -= ms
+        return slots[self.time_left[slots] < 0]
+
+    def touching(self,x,y,r,slots):
+        """Whether circles at x,y (arrays) of radii r (an array, or
+        a number) are touching, or very nearly, any of the bodies in
+        slots.  Return an array of bools, one for each circle"""
+        if not len(slots):
+            return numpy.zeros(len(x),bool)
+        dx = x[:,None] - self.x[slots][None,:]
+        dy = y[:,None] - self.y[slots][None,:]
+        reach = numpy.asarray(r)[...,None] + self.radius[slots][None,:]
+        return (dx * dx + dy * dy < reach * reach + 1e-6).any(axis=1)
@@ -0,0 +1,137 @@
+"""
+ Field of view on the hexagon grid
+
+ Shadowcasting, ring by ring out from the viewer's hexagon.  Every
+ solid hexagon casts a shadow over the angles (seen from the centre
+ of the viewer's hexagon) between its outermost corners, onto the
+ rings beyond it.  A hexagon can be seen if the angle of its centre
+ isn't in the shadow of a hexagon nearer in: that is, if a straight
+ line from centre to centre doesn't pass through a solid hexagon on
+ the way, as raycast.raycast() would find.  A line that just touches
+ a corner of a solid hexagon counts as blocked.
+
+ A FieldOfView remembers what can be seen from the last hexagon it
+ looked from, and only works it out again when the viewer moves to
+ another hexagon, or a hexagon within its radius is destroyed.
+"""
+from bisect import bisect_right
+from math import atan2, pi
+
+import hexgrid
+
+TWO_PI = 2 * pi
+CORNERS = [(1.0,0.0),(0.5,hexgrid.Sin60),(-0.5,hexgrid.Sin60),
+           (-1.0,0.0),(-0.5,-hexgrid.Sin60),(0.5,-hexgrid.Sin60)]
+EPSILON = 1e-9 # shadows are this much wider, so touching is blocked
+
+
+def merge(arcs):
+    """Sorted arcs with the overlapping and touching ones joined"""
+    merged = []
+    for lo,hi in sorted(tuple(arc) for arc in arcs):
+        if merged and lo <= merged[-1][1]:
+            if hi > merged[-1][1]:
+                merged[-1][1] = hi
+        else:
+            merged.append([lo,hi])
+    return merged
+
+def in_shadow(u,shadows,los):
+    """Whether u is strictly inside one of the merged shadows,
+    whose starts are los"""
+    i = bisect_right(los,u) - 1
+    return i >= 0 and u < shadows[i][1] and u > shadows[i][0]
+
+def all_dark(shadows):
+    """Whether the shadows cover the whole way round"""
+    arcs = []
+    for lo,hi in shadows:
+        arcs.append((lo,hi))
+        if hi > TWO_PI:
+            arcs.append((lo - TWO_PI,hi - TWO_PI))
+    reach = 0
+    for lo,hi in sorted(arcs):
+        if lo > reach:
+            return False
+        reach = max(reach,hi)
+    return reach >= TWO_PI
+
+def shadow_of(dx,dy,a):
+    """The arc of angles covered by the hexagon whose centre is dx,dy
+    from the viewer, at angle a, starting in 0..2pi"""
+    turns = [(atan2(dy + cy,dx + cx) - a + pi) % TWO_PI - pi
+             for cx,cy in CORNERS]
+    lo = a + min(turns) - EPSILON
+    hi = a + max(turns) + EPSILON
+    if lo < 0:
+        lo,hi = lo + TWO_PI,hi + TWO_PI
+    return lo,hi
+
+def shadowcast(level,col,row,radius):
+    """Set of (col,row) that can be seen from the hexagon col,row,
+    up to radius steps away"""
+    is_solid = level.is_solid
+    x0,y0 = hexgrid.hex_centre(col,row)
+    visible = set([(col,row)])
+    shadows,los = [],[]
+    for k in range(1,radius + 1):
+        casts = []
+        for cell in hexgrid.ring(col,row,k):
+            x,y = hexgrid.hex_centre(*cell)
+            dx,dy = x - x0,y - y0
+            a = atan2(dy,dx) % TWO_PI
+            if not (in_shadow(a,shadows,los)
+                    or in_shadow(a + TWO_PI,shadows,los)):
+                visible.add(cell)
+            if is_solid(*cell):
+                # even if it can't be seen itself, some of it may be
+                # in the way of hexagons further out
+                casts.append(shadow_of(dx,dy,a))
+        if casts:
+            shadows = merge(shadows + casts)
+            los = [lo for lo,hi in shadows]
+            if all_dark(shadows):
+                break
+    return visible
+
+
+class FieldOfView(object):
+    radius = 12
+
+    def __init__(self,level,radius=None):
+        self.level = level
+        if radius is not None:
+            self.radius = radius
+        self.origin = None
+        self.visible = frozenset()
+        self.stale = True
+        self.version = 0 # goes up each time visible changes
+        self.recomputes = 0
+
+    def look_from(self,col,row):
+        """The hexagons that can be seen from col,row"""
+        if self.stale or (col,row) != self.origin:
+            self.origin = col,row
+            self.visible = frozenset(
+                shadowcast(self.level,col,row,self.radius))
+            self.stale = False
+            self.version += 1
+            self.recomputes += 1
+        return self.visible
+
+    def can_see(self,col,row):
+        """Whether col,row could be seen from where we last looked"""
+        return (col,row) in self.visible
+
+    def cell_changed(self,hc,hr):
+        """The hexagon at hc,hr has been destroyed"""
+        # it may have been casting a shadow even if it couldn't be seen
+        if (self.origin is not None and
+            hexgrid.hex_distance(self.origin[0],self.origin[1],hc,hr)
+            <= self.radius):
+            self.stale = True
+
+    def forget(self):
+        """Look again next time, e.g. because the level has
+        changed a lot"""
+        self.stale = True
@@ -5,6 +5,47 @@
 import pyglet
 from tdgl.gl import tdgl_draw_parts
 import screen
+import main # for options
+
+class FixedStepClock(object):
+    """Turns variable frame times into a whole number of fixed
+    simulation steps, carrying the remainder over to the next frame.
+
+    If the simulation falls too far behind (more than max_steps in
+    one frame) the excess time is dropped, so a slow machine runs
+    the game slower instead of spiralling into ever longer frames.
+
+    A rate of 0 gives the old behaviour: one step of whatever time
+    the frame took.
+    """
+    def __init__(self,rate=100,max_steps=5):
+        self.rate = rate
+        self.step_ms = 1000.0 / rate if rate else 0
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+
+    def reset(self):
+        self.accumulator = 0.0
+
+    def advance(self,ms):
+        """List of step times to simulate for ms of real time"""
+        if not self.rate:
+            return [ms]
+        self.accumulator += ms
+        steps = int(self.accumulator // self.step_ms)
+        if steps > self.max_steps:
+            steps = self.max_steps
+            self.accumulator = steps * self.step_ms
+        self.accumulator -= steps * self.step_ms
+        return [self.step_ms] * steps
+
+    @property
+    def alpha(self):
+        """How far we are between the last step and the next,
+        for interpolating positions when drawing"""
+        if not self.rate:
+            return 1.0
+        return self.accumulator / self.step_ms
 
 class GameWindow(pyglet.window.Window):
     """A pyglet Window that displays a series of Screen
@@ -12,20 +53,24 @@ class GameWindow(pyglet.window.Window):
     def __init__(self,**kw):
         super(GameWindow,self).__init__(**kw)
         pyglet.clock.schedule(self.on_tick)
+        self.clock = FixedStepClock(main.options.sim_rate)
         self.this_screen = screen.next()
         
     def on_tick(self,secs):
-        ms = secs * 1000
         s = self.this_screen
         if not s:
             self.close()
-        s.step(ms)
+        for ms in self.clock.advance(secs * 1000):
+            s.step(ms)
+            if s.expired():
+                break
         if s.expired():
             try:
                 del self.this_screen
                 s = screen.next()
                 s.resize(*self.get_size())
                 self.this_screen = s
+                self.clock.reset()
             except StopIteration:
                 self.close()
 
@@ -33,7 +78,9 @@ class GameWindow(pyglet.window.Window):
         self.clear()
         s = self.this_screen
         if s:
+            s.begin_interpolation(self.clock.alpha)
             tdgl_draw_parts(s)
+            s.end_interpolation()
 
     def on_resize(self,w,h):
         s = self.this_screen
@@ -5,7 +5,6 @@ import pickle
 import pyglet
 from tdgl.gl import *
 from tdgl import part, objpart, viewpoint, panel, animator
-from tdgl.vec import Vec
 
 import collision, levelfile
 
@@ -63,6 +62,8 @@ class HexagonField(part.Part):
         self.level = level
         self.ndl = 0
         self.dlbase = None
+        self.all_dl = None
+        self.visible = None # {(u,v)} to draw, or None for all
         self.build_dl()
 
     def __del__(self):
@@ -122,7 +123,8 @@ class HexagonField(part.Part):
                             glVertex2f(x,y)
                         glVertex2f(*hexcorners[0])
 
-        self.all_dl = glGenLists(1)
+        if self.all_dl is None:
+            self.all_dl = glGenLists(1)
 
     def setup_style(self):
         glEnable(GL_COLOR_MATERIAL)
@@ -137,29 +139,32 @@ class HexagonField(part.Part):
         with gl_compile(self.all_dl):
             dlbase = self.dlbase
             h2w = hex_to_world_coords
+            visible = self.visible
             for (u,v),d in self.cells.items():
+                if visible is not None and (u,v) not in visible:
+                    continue
                 dx,dy = h2w(u,v)
                 glTranslatef(dx,dy,0)
                 glCallList(dlbase + d)
                 glTranslatef(-dx,-dy,0)
 
-    def destroy(self,hc,hr):
-        """Destroy the hexagon at hc,hr.
-        Return false if not possible"""
-        c = self.level.destroy(hc,hr)
-        if c:
-            self.cells[hc,hr] = 0 # blank
-            self.prepare()
-            return c
-
-    def collect(self,hc,hr):
-        """Collect the powerup at hc,hr
-        Return false if not possible"""
-        p = self.level.collect(hc,hr)
-        if p:
-            self.cells[hc,hr] = 0 # blank
-            self.prepare()
-        return p
+    def clear_cell(self,hc,hr):
+        """Show the cell at hc,hr as blank floor, after its
+        hexagon has been destroyed or its powerup collected.
+        Call prepare() to see the change."""
+        self.cells[hc,hr] = 0 # blank
+
+    def restore_cell(self,hc,hr):
+        """Show the cell at hc,hr as it now is in the level, after
+        it has been put back by World.restore().  Call prepare()
+        to see the change."""
+        self.cells[hc,hr] = self.celltypes[self.level.hexes[hc,hr]].n
+
+    def set_visible(self,cells):
+        """Only draw the cells in cells (None to draw them all),
+        e.g. those the player can see (see fov.py)"""
+        self.visible = cells
+        self.prepare()
 
 
 class StoryPanel(panel.LabelPanel):
@@ -182,10 +187,12 @@ class ClockPart(part.Part):
             self.clock.draw()
 
 class Player(objpart.ObjPart):
-    _default_geom = {'radius':0.49}
-    def __init__(self,name,**kw):
+    def __init__(self,name,body=None,**kw):
         super(Player,self).__init__(name,**kw)
+        self.body = body
         self.anim = animator.Mutator(self._geom)
+        if body:
+            self.pos = body.pos
 
     def step(self,ms):
         self.anim.step(ms)
@@ -197,6 +204,11 @@ class Player(objpart.ObjPart):
         self.pos = (x,y,z) # Vec won't work
         self.anim.change("pos",(x,y,z-1.0),500)
 
+    def revive(self):
+        """Stand up again where the body is, after die()"""
+        self.anim["pos"] = tuple(self.body.pos)
+        self.restyle() # all the pieces again
+
 
 BallStyles = {
     "Ball":{ "obj-filename":"prismball.obj" },
@@ -208,59 +220,80 @@ BallStyles = {
 }
 
 class Ball(objpart.ObjPart):
-    _default_geom = {'radius':0.2}
-    lethal = True
-    speed = 0.01
-    duration = 6000
-    maxdestroy = 4
-    bounces = True
-    ammo = 1
-
-    def __init__(self,name='',direction=None,**kw):
+    """ A ball, drawn at the position of its body
+    (see bodies.Ball for what it does) """
+    def __init__(self,name='',body=None,**kw):
         super(Ball,self).__init__(name,**kw)
-        if direction:
-            self.velocity = Vec(direction).normalise() * self.speed
-        else:
-            self.velocity = Vec(0,0,0)
+        self.body = body
+        if body:
+            self.pos = body.pos
 
-    def step(self,ms):
-        self.duration = self.duration - ms
-        if self.duration < 0:
-            self._expired = True
+    def expired(self):
+        return self._expired or (self.body and self.body.expired)
 
 class BlitzBall(Ball):
-    _default_geom = {'radius':0.2}
-    duration = 1000
-    speed = 0.018
-    ammo = 5
-    
+    pass
+
 class BowlingBall(Ball):
-    _default_geom = {'radius':0.4}
-    speed = 0.005
-    duration = 10000
-    maxdestroy = 8
-    ammo = 3
+    pass
 
 class HappyBall(Ball):
-    _default_geom = {'radius':0.2}
-    lethal = False
-    maxdestroy = float('inf')
-    duration = float('inf')
-    ammo = 1
+    pass
 
 class SpikeBall(Ball):
-    _default_geom = {'radius':0.2}
-    maxdestroy = 10
-    bounces = False
-    duration = 8000
-    ammo = 4
+    pass
 
 class DeathBall(Ball):
-    _default_geom = {'radius':0.2}
-    maxdestroy = 13
-    duration = 10000
-    ammo = 3
-    speed = 0.016
+    pass
+
+class BallPool(object):
+    """Ball parts, already styled and prepared, ready to show the
+    next ball of their class that is fired.  Balls that have
+    expired are given back to be used again, instead of each new
+    ball matching the stylesheet and preparing its model."""
+    def __init__(self):
+        self.free = {} # {class:[Ball]}
+        self.made = 0
+        self.reused = 0
+        self.given_back = 0
+
+    def make(self,B):
+        ball = B()
+        ball.restyle(True)
+        self.made += 1
+        return ball
+
+    def warm(self,B,count):
+        """Have at least count balls of class B ready"""
+        free = self.free.setdefault(B,[])
+        while len(free) < count:
+            free.append(self.make(B))
+
+    def take(self,B,body):
+        """A ball of class B, to be drawn where body is"""
+        free = self.free.get(B)
+        if free:
+            ball = free.pop()
+            self.reused += 1
+        else:
+            ball = self.make(B)
+        ball.body = body
+        ball.pos = body.pos
+        ball.angle = body.angle
+        return ball
+
+    def give_back(self,ball):
+        """Keep a ball whose body has expired, for next time"""
+        ball.body = None
+        ball._expired = False
+        self.free.setdefault(ball.__class__,[]).append(ball)
+        self.given_back += 1
+
+    def stats(self):
+        """{name:count} of how the pool has been used"""
+        return {"made":self.made, "reused":self.reused,
+                "given back":self.given_back,
+                "free":sum(len(f) for f in self.free.values())}
 
 class ScreenBorder(part.Part):
     _default_geom={"width":1024,"height":768}
@@ -291,6 +324,11 @@ class ScreenBorder(part.Part):
     def set_score(self,score):
         self.target_score = score
 
+    def reset_score(self,score):
+        """Show score straight away, even if it is less"""
+        self.score = self.target_score = score
+        self.prepare_score()
+
     def step(self,ms):
         if self.target_score > self.score:
             self.score = min(self.score + int(ms)//2, self.target_score)
@@ -0,0 +1,137 @@
+"""
+ Hexagon grid coordinates
+
+ Levels address hexagons by (col,row) "offset" coordinates, where
+ the centres of odd columns are half a row higher than even ones
+ (see collision.h_centre).  That is handy for storage, but awkward
+ for arithmetic, so this module converts to and from axial (q,r)
+ coordinates:
+
+    q = col
+    r = row - col // 2
+
+ and cube coordinates (x,y,z) = (q, -q-r, r), in which the six
+ neighbours of a hexagon are found by adding a fixed offset, and
+ the grid distance between two hexagons is half the sum of the
+ absolute cube coordinate differences.
+
+ Everything here works on plain ints and floats, without making
+ Vec objects or sorting candidate lists. The *_array functions do
+ the same for numpy arrays of coordinates, if numpy is installed.
+"""
+
+from math import floor
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+R3 = 3.0**0.5
+Sin60 = R3*0.5
+
+# Axial offsets to the neighbours of a hexagon, in the same order
+# as the sides in collision.H_NORMAL (anticlockwise from 30 degrees)
+DIRECTIONS = [(1,0),(0,1),(-1,1),(-1,0),(0,-1),(1,-1)]
+
+def offset_to_axial(col,row):
+    return col, row - (col >> 1)
+
+def axial_to_offset(q,r):
+    return q, r + (q >> 1)
+
+def offset_to_cube(col,row):
+    q,r = col, row - (col >> 1)
+    return q, -q-r, r
+
+def hex_centre(col,row):
+    """x,y of hexagon centre, as a tuple"""
+    return col * 1.5, row * R3 + Sin60 * (col % 2)
+
+def axial_round(fq,fr):
+    """Round fractional axial coordinates to the hexagon
+    containing them"""
+    fy = -fq - fr
+    q,y,r = floor(fq + 0.5), floor(fy + 0.5), floor(fr + 0.5)
+    dq,dy,dr = abs(q - fq), abs(y - fy), abs(r - fr)
+    if dq > dy and dq > dr:
+        q = -y - r
+    elif dy <= dr:
+        r = -q - y
+    return int(q), int(r)
+
+def pixel_to_hex(x,y):
+    """(col,row) of the hexagon containing point x,y"""
+    fq = x / 1.5
+    q,r = axial_round(fq, y / R3 - fq * 0.5)
+    return q, r + (q >> 1)
+
+def hex_distance(col0,row0,col1,row1):
+    """Number of steps between two hexagons"""
+    dq = col1 - col0
+    dr = (row1 - (col1 >> 1)) - (row0 - (col0 >> 1))
+    return (abs(dq) + abs(dq + dr) + abs(dr)) // 2
+
+def neighbour(col,row,direction):
+    """(col,row) of the next hexagon in one of the six DIRECTIONS"""
+    dq,dr = DIRECTIONS[direction % 6]
+    q = col + dq
+    return q, row - (col >> 1) + dr + (q >> 1)
+
+def neighbours(col,row):
+    """Yield (col,row) of the six hexagons around col,row"""
+    r = row - (col >> 1)
+    for dq,dr in DIRECTIONS:
+        q = col + dq
+        yield q, r + dr + (q >> 1)
+
+def ring(col,row,radius):
+    """Yield (col,row) of the hexagons exactly radius steps from
+    col,row, going anticlockwise"""
+    if radius <= 0:
+        yield col,row
+        return
+    # start radius steps out in direction 4, then walk round
+    q = col
+    r = row - (col >> 1) - radius
+    for dq,dr in DIRECTIONS:
+        for i in range(radius):
+            yield q, r + (q >> 1)
+            q += dq
+            r += dr
+
+def spiral(col,row,radius):
+    """Yield (col,row) of every hexagon within radius steps of
+    col,row, nearest rings first"""
+    for k in range(radius + 1):
+        for h in ring(col,row,k):
+            yield h
+
+def pixel_to_hex_array(x,y):
+    """Vectorised pixel_to_hex for numpy arrays of x and y.
+    Return arrays (cols,rows)"""
+    fq = numpy.asarray(x,dtype=float) / 1.5
+    fr = numpy.asarray(y,dtype=float) / R3 - fq * 0.5
+    fs = -fq - fr
+    q = numpy.floor(fq + 0.5)
+    s = numpy.floor(fs + 0.5)
+    r = numpy.floor(fr + 0.5)
+    dq,ds,dr = abs(q - fq), abs(s - fs), abs(r - fr)
+    qbad = (dq > ds) & (dq > dr)
+    rbad = ~qbad & (ds <= dr)
+    q = numpy.where(qbad, -s - r, q).astype(int)
+    r = numpy.where(rbad, -q - s, r).astype(int)
+    return q, r + (q >> 1)
+
+def hex_centre_array(cols,rows):
+    """Vectorised hex_centre. Return arrays (x,y)"""
+    cols = numpy.asarray(cols)
+    return cols * 1.5, numpy.asarray(rows) * R3 + Sin60 * (cols % 2)
+
+def hex_distance_array(col0,row0,col1,row1):
+    """Vectorised hex_distance"""
+    col0,row0 = numpy.asarray(col0),numpy.asarray(row0)
+    col1,row1 = numpy.asarray(col1),numpy.asarray(row1)
+    dq = col1 - col0
+    dr = (row1 - (col1 >> 1)) - (row0 - (col0 >> 1))
+    return (abs(dq) + abs(dq + dr) + abs(dr)) // 2
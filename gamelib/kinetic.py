@@ -0,0 +1,131 @@
+"""
+ Kinetic scheduling of monsters' wall hits
+
+ Most monsters walk in straight lines at a steady speed between
+ bumping into things, so it can be worked out in advance when each
+ one will next get near a wall, instead of testing for collisions
+ with the walls every step.
+
+ A WallSchedule keeps a heap of (time, monster), where time is the
+ earliest time in ms (on the World's clock) that the monster could
+ touch a wall if it goes on as it is.  World.step_monsters() asks
+ for the monsters due in each step, tests only those against the
+ walls, and schedules them again afterwards.  The rest are moved
+ along without any collision tests.
+
+ The prediction is conservative: a monster is due as soon as it
+ gets within 1 + radius of the centre of a solid hexagon, which is
+ where the ordinary collision test (collision.collides_xy) starts to
+ notice it, and the swept test can only notice it later.  So skipping
+ the tests in between never changes what happens.
+
+ A monster whose velocity has changed since it was scheduled (by
+ bumping into a ball or the player, or by steering) is due at once.
+ When a hexagon is destroyed, monsters that were heading for it are
+ scheduled again, since they can now go further.  Walls never
+ appear during play, so nothing else can make a monster due sooner.
+"""
+import heapq
+from math import sqrt
+
+import collision
+
+EPSILON = 0.01  # distance to allow for rounding in the positions
+
+class WallSchedule(object):
+    horizon = 6.0  # distance ahead to look for walls
+
+    def __init__(self,level):
+        self.level = level
+        self.heap = []
+        self.entries = {} # {monster:(time,vx,vy,cell)}
+        self.waiting = set() # due, and not scheduled again yet
+        self.count = 0
+        self.predictions = 0
+
+    def distance_to_wall(self,pos,velocity,r):
+        """(distance, (col,row)) that a circle of radius r at pos can
+        move along velocity before it is within 1 + r of the centre
+        of a solid hexagon, or (horizon, None) if it can move at least
+        the horizon"""
+        x,y = pos.x,pos.y
+        speed = velocity.length()
+        ux,uy = velocity.x / speed, velocity.y / speed
+        D = self.horizon
+        R = 1.0 + r
+        reach = int((D * 0.5 + R) / 1.5) + 2
+        mx,my = x + ux * D * 0.5, y + uy * D * 0.5
+        hcol = int((mx / 1.5) + 0.5)
+        hrow = int(((my - collision.Sin60 * (hcol % 2)) / collision.R3) + 0.5)
+        best,cell = D,None
+        RR = R * R
+        for hc,hr,hx,hy in self.level.scan_solid(hcol,hrow,reach):
+            wx,wy = x - hx, y - hy
+            b = wx * ux + wy * uy
+            c = wx * wx + wy * wy - RR
+            if c <= 0:
+                return 0.0,(hc,hr)
+            if b >= 0:
+                continue # moving away
+            disc = b * b - c
+            if disc < 0:
+                continue # passing by
+            s = -b - sqrt(disc)
+            if s < best:
+                best,cell = s,(hc,hr)
+        return best,cell
+
+    def schedule(self,mon,now):
+        """Work out when mon, at its position at time now, could next
+        touch a wall"""
+        self.waiting.discard(mon)
+        v = mon.velocity
+        if not (v.x or v.y):
+            # standing still: due when it starts to move
+            self.entries[mon] = None,v.x,v.y,None
+            return
+        self.predictions += 1
+        s,cell = self.distance_to_wall(mon.pos,v,mon.radius)
+        t = now + max(0.0,s - EPSILON) / v.length()
+        self.entries[mon] = t,v.x,v.y,cell
+        self.count += 1
+        heapq.heappush(self.heap,(t,self.count,mon))
+
+    def due(self,now,mons):
+        """The monsters that could touch a wall by time now: those
+        whose time has come, those still waiting from earlier steps,
+        and any in mons whose velocity has changed"""
+        found = self.waiting
+        heap = self.heap
+        entries = self.entries
+        while heap and heap[0][0] <= now:
+            t,n,mon = heapq.heappop(heap)
+            entry = entries.get(mon)
+            if entry and entry[0] == t:
+                found.add(mon)
+        for mon in mons:
+            entry = entries.get(mon)
+            if (entry is None or entry[1] != mon.velocity.x
+                or entry[2] != mon.velocity.y):
+                found.add(mon)
+        for mon in found:
+            entries[mon] = None # due until scheduled again
+        return set(found)
+
+    def wall_removed(self,hc,hr,now):
+        """Reschedule monsters that were heading for the hexagon
+        at hc,hr, which has been destroyed"""
+        for mon,entry in self.entries.items():
+            if entry and entry[3] == (hc,hr) and not mon.expired:
+                self.schedule(mon,now - mon.owed)
+
+    def forget(self,mon):
+        self.entries.pop(mon,None)
+        self.waiting.discard(mon)
+
+    def clear(self):
+        """Forget every monster, e.g. because they have all been
+        put somewhere else"""
+        self.heap = []
+        self.entries = {}
+        self.waiting = set()
@@ -0,0 +1,189 @@
+#! /usr/bin/env python
+"""
+   Check that levels can be finished.
+
+   For each level, search the hexagon grid from the start for the
+   cheapest way to the exit, where walking onto floor costs a step,
+   walking onto a destructible hexagon (H, or one of the metals)
+   costs a step and a ball hit to destroy it first, and walls that
+   can't be destroyed (#^v<>L) can't be crossed.  Paths are compared
+   by the number of hexagons destroyed, then by the number of steps.
+
+   Report the shortest path to the exit, the hexagons that must be
+   destroyed on it, the fewest balls that could do it (each Ball
+   destroys at most bodies.Ball.maxdestroy hexagons), powerups that can't be
+   reached at all, and places where the player could walk off the
+   edge of the level.
+
+   Run from the gamelib directory:
+
+     python levelcheck.py [options] [levelfile ...]
+
+   With no files, every .lev file in ../data is checked, spread
+   across a pool of processes.  The editor runs check_level() each
+   time a level is saved.
+"""
+import os
+import sys
+import glob
+import heapq
+from multiprocessing import Pool
+from optparse import OptionParser
+
+import bodies
+import hexgrid
+import levelfile
+
+def cell_cost(level,cellcode):
+    """Number of hexes destroyed to walk onto a cell, or None if
+    it can't be walked onto at all"""
+    if not levelfile.is_solid(cellcode):
+        return 0
+    if level.hexpoints(cellcode):
+        return 1
+    return None
+
+def search(level):
+    """Cheapest way from the start to every reachable cell.
+    Return ({(col,row):(destroyed,steps)}, {(col,row):previous cell},
+    bounds) where bounds is (mincol,minrow,maxcol,maxrow) of the
+    cells searched: one cell all round the level's hexes"""
+    hexes = level.hexes
+    cols = [c for c,r in hexes]
+    rows = [r for c,r in hexes]
+    c0,r0,c1,r1 = min(cols) - 1, min(rows) - 1, max(cols) + 1, max(rows) + 1
+    start = level.start
+    best = {start:(0,0)}
+    came_from = {}
+    queue = [(0,0,start)]
+    costs = {}
+    while queue:
+        destroyed,steps,cell = heapq.heappop(queue)
+        if best[cell] < (destroyed,steps):
+            continue
+        for n in hexgrid.neighbours(*cell):
+            hc,hr = n
+            if not (c0 <= hc <= c1 and r0 <= hr <= r1):
+                continue
+            cost = costs.get(n,-1)
+            if cost == -1:
+                cost = costs[n] = cell_cost(level,hexes.get(n," "))
+            if cost is None:
+                continue
+            d = destroyed + cost, steps + 1
+            if d < best.get(n,(sys.maxint,0)):
+                best[n] = d
+                came_from[n] = cell
+                heapq.heappush(queue,(d[0],d[1],n))
+    return best,came_from,(c0,r0,c1,r1)
+
+def path_to(came_from,start,goal):
+    path = [goal]
+    while path[-1] != start:
+        path.append(came_from[path[-1]])
+    path.reverse()
+    return path
+
+def check_level(level,maxdestroy=None):
+    """Check one level. Return a dict of findings:
+      reachable : whether the exit can be reached
+      steps     : length of the shortest path to the exit
+      path      : cells on it, from start to exit
+      destroy   : cells that must be destroyed on it
+      balls     : fewest balls that could destroy them
+      powerups  : {(col,row):(destroyed,steps)} for each powerup
+      unreachable_powerups : powerups that can't be reached
+      leaks     : edge cells the player can reach off the level
+      problems  : list of strings describing anything wrong
+    maxdestroy limits the hexes that may be destroyed on the way
+    to the exit"""
+    best,came_from,(c0,r0,c1,r1) = search(level)
+    hexes = level.hexes
+    report = dict(reachable=False,steps=None,path=[],destroy=[],
+                  balls=0,powerups={},unreachable_powerups=[],
+                  leaks=[],problems=[])
+    problems = report["problems"]
+    exit = level.exit
+    if exit in best:
+        path = path_to(came_from,level.start,exit)
+        destroy = [c for c in path if levelfile.is_solid(hexes.get(c," "))]
+        balls = -(-len(destroy) // bodies.Ball.maxdestroy)
+        report.update(reachable=True,steps=len(path) - 1,path=path,
+                      destroy=destroy,balls=balls)
+        if maxdestroy is not None and len(destroy) > maxdestroy:
+            problems.append(
+                "exit needs {0} hexes destroyed, more than {1}".format(
+                    len(destroy),maxdestroy))
+    else:
+        problems.append("exit {0} can't be reached".format(exit))
+    for coords in sorted(level.powerups):
+        if coords in best:
+            report["powerups"][coords] = best[coords]
+        else:
+            report["unreachable_powerups"].append(coords)
+            problems.append("powerup at {0} can't be reached".format(coords))
+    leaks = sorted(c for c in best
+                   if c not in hexes
+                   and (c[0] in (c0,c1) or c[1] in (r0,r1)))
+    if leaks:
+        report["leaks"] = leaks
+        problems.append("player can walk off the level at {0}".format(
+                ", ".join(str(c) for c in leaks[:4])))
+    return report
+
+def format_report(name,report):
+    lines = []
+    if report["reachable"]:
+        line = "{0}: exit in {1} steps".format(name,report["steps"])
+        n = len(report["destroy"])
+        if n:
+            line += ", destroying {0} hex{1} with at least {2} ball{3}: {4}".format(
+                n,"" if n == 1 else "es",report["balls"],
+                "" if report["balls"] == 1 else "s",
+                " ".join(str(c) for c in report["destroy"]))
+        lines.append(line)
+    else:
+        lines.append("{0}: NOT SOLVABLE".format(name))
+    for p in report["problems"]:
+        lines.append("  " + p)
+    return "\n".join(lines)
+
+def check_file(args):
+    """check_level() on a level file, for use in a Pool"""
+    fname,maxdestroy = args
+    level = levelfile.load_level(fname)
+    if level is None:
+        return fname,None
+    return fname,check_level(level,maxdestroy)
+
+def main(argv):
+    op = OptionParser("usage: %prog [options] [levelfile ...]")
+    add = op.add_option
+    add("--max-destroy",default=None,type="int",
+        help="Most hexes a level may need destroyed to reach the exit")
+    add("-j","--jobs",default=None,type="int",
+        help="Number of processes [ number of CPUs ]")
+    options,args = op.parse_args(argv)
+    fnames = args or sorted(glob.glob(os.path.join(
+                os.path.dirname(os.path.abspath(__file__)),
+                "..","data","*.lev")))
+    work = [(f,options.max_destroy) for f in fnames]
+    if options.jobs == 1 or len(work) < 2:
+        results = map(check_file,work)
+    else:
+        pool = Pool(options.jobs)
+        results = pool.map(check_file,work)
+        pool.close()
+    ok = True
+    for fname,report in results:
+        name = os.path.basename(fname)
+        if report is None:
+            print "{0}: can't load".format(name)
+            ok = False
+        else:
+            print format_report(name,report)
+            ok = ok and not report["problems"]
+    return ok
+
+if __name__ == '__main__':
+    sys.exit(0 if main(sys.argv[1:]) else 1)
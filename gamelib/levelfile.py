@@ -31,6 +31,20 @@
  ----------
  Ball class name
 
+
+ Chunked levels
+ --------------
+ A very big level can be saved with Level.save_chunks(), cut into
+ square chunks of CHUNK_SIZE columns and rows.  The file holds the
+ level representation above without its hexes, monsters and
+ powerups, plus "chunk_size" and "chunks": {(kx,ky):(offset,length)}
+ saying where each chunk is.  The chunks follow, each a pickled
+ {"hexes":{...}, "monsters":{...}, "powerups":{...}}.
+
+ open_chunks() reads just the first part, so that chunks can be read
+ one at a time as they are wanted (see streaming.py).  load_level()
+ reads a chunked level whole.
+
 """
 import os
 from pyglet import resource
@@ -40,6 +54,7 @@ import re
 
 import collision
 
+CHUNK_SIZE = 16
 HEXPOINTS = {
     "Pt":1000,
     "Au":750,
@@ -51,6 +66,10 @@ HEXPOINTS = {
     "Hffff":100,
     }
 
+def is_solid(cellcode):
+    """Whether a cell code is an obstacle to balls and monsters"""
+    return cellcode not in " SXOP"
+
 class Level:
     def __init__(self,leveldict=None):
         self.name = "a level"
@@ -69,28 +88,199 @@ class Level:
             self.__dict__.update(copy.deepcopy(leveldict))
         self.hexes[self.start] = "S"
         self.hexes[self.exit] = "X"
+        self.build_grid()
+
+    def build_grid(self,margin=2):
+        """Build the dense solidity grid from the hexes dict.
+
+        The grid is a bytearray holding 1 for each solid cell, stored
+        column by column from grid_origin, so the rows of one column
+        near a point are a contiguous slice. It covers every cell in
+        the level plus a margin of empty cells all round."""
+        if self.hexes:
+            cols = [c for c,r in self.hexes]
+            rows = [r for c,r in self.hexes]
+        else:
+            cols = rows = [0]
+        c0,r0 = min(cols) - margin, min(rows) - margin
+        self.grid_origin = c0,r0
+        self.grid_size = (max(cols) + margin + 1 - c0,
+                          max(rows) + margin + 1 - r0)
+        self.solid = bytearray(self.grid_size[0] * self.grid_size[1])
+        for coords,cellcode in self.hexes.items():
+            if is_solid(cellcode):
+                self.solid[self.grid_index(*coords)] = 1
+        self.clear_neighbourhoods()
+
+    def grid_index(self,hc,hr):
+        """Index of cell hc,hr in the solidity grid, or None if
+        it lies outside the grid"""
+        c0,r0 = self.grid_origin
+        w,h = self.grid_size
+        u,v = hc - c0, hr - r0
+        if 0 <= u < w and 0 <= v < h:
+            return u * h + v
+
+    def set_solid(self,coords,solid):
+        i = self.grid_index(*coords)
+        if i is None:
+            if not solid:
+                return
+            self.build_grid()
+            i = self.grid_index(*coords)
+        s = 1 if solid else 0
+        if self.solid[i] != s:
+            self.solid[i] = s
+            self.invalidate_neighbourhoods(*coords)
+
+    def is_solid(self,hc,hr):
+        i = self.grid_index(hc,hr)
+        return i is not None and self.solid[i] == 1
 
     @property
     def celltypes(self):
         return set(self.hexes.values())
 
+    def as_dict(self):
+        """The level definition, as stored in a level file"""
+        return copy.deepcopy(dict(
+                name=self.name, story=self.story,
+                start=self.start, exit=self.exit,
+                hexes=self.hexes, monsters=self.monsters,
+                sound=self.sound, powerups=self.powerups,
+                music=self.music, bg=self.bg, fg=self.fg, bd=self.bd))
+
     def save(self,fname):
-        d = dict(name=self.name, story=self.story,
-                 start=self.start, exit=self.exit,
-                 hexes=self.hexes, monsters=self.monsters,
-                 sound=self.sound, powerups=self.powerups,
-                 music=self.music, bg=self.bg, fg=self.fg, bd=self.bd)
+        with open(os.path.join("data",fname),"wb") as f:
+            pickle.dump(self.as_dict(),f,-1)
+
+    def save_chunks(self,fname,size=CHUNK_SIZE):
+        """Save the level cut into chunks of size columns and rows"""
+        d = self.as_dict()
+        chunks = {}
+        for part in ("hexes","monsters","powerups"):
+            for (hc,hr),code in d.pop(part).items():
+                chunk = chunks.setdefault(chunk_of(hc,hr,size),
+                                          empty_chunk())
+                chunk[part][hc,hr] = code
+        index = {}
+        data = []
+        offset = 0
+        for key,chunk in sorted(chunks.items()):
+            s = pickle.dumps(chunk,-1)
+            index[key] = offset,len(s)
+            data.append(s)
+            offset += len(s)
+        d["chunk_size"] = size
+        d["chunks"] = index
         with open(os.path.join("data",fname),"wb") as f:
             pickle.dump(d,f,-1)
+            for s in data:
+                f.write(s)
+
+    def add_cells(self,hexes,powerups=()):
+        """Put more hexes and powerups {(col,row):code} into the
+        level.  Call build_grid() afterwards."""
+        self.hexes.update(hexes)
+        self.powerups.update(powerups)
+
+    def remove_cells(self,cells):
+        """Take hexes out of the level, as if they had never been
+        part of it.  Call build_grid() afterwards."""
+        for coords in cells:
+            self.hexes.pop(coords,None)
+            self.powerups.pop(coords,None)
 
     def __setitem__(self,coords,cellcode):
+        was = self.hexes.get(coords," ")
         self.hexes[coords] = cellcode
+        self.set_solid(coords,is_solid(cellcode))
+        if was != cellcode and is_solid(was) and is_solid(cellcode):
+            # still solid, but the neighbourhoods hold its code
+            self.invalidate_neighbourhoods(*coords)
+
+    def __delitem__(self,coords):
+        del self.hexes[coords]
+        self.set_solid(coords,False)
+
+    def obstacles_near(self,x,y,d=2):
+        """Solid hexes within grid distance d of the hexagon nearest
+        to x,y, as a list of (col,row,cellcode) by column and row.
+        The list may be shared, so don't change it.
+
+        It isn't sorted by distance from x,y, so that the same list
+        can be kept for every point in the cell: where a circle hits
+        more than one, collision.collides_first() and sweep() take
+        the nearest (see collision.obstacle_order())."""
+        hcol = int((x / 1.5) + 0.5)
+        adjust = collision.Sin60 * (hcol % 2)
+        hrow = int(((y - adjust) / collision.R3) + 0.5)
+        if self.cache_neighbourhoods:
+            key = d,hcol,hrow
+            near = self.neighbourhoods.get(key)
+            if near is None:
+                self.cache_misses += 1
+                near = self.neighbourhoods[key] = self.solid_near(
+                    hcol,hrow,d)
+                self.neighbourhood_reach.add(d)
+            else:
+                self.cache_hits += 1
+            return near
+        return self.solid_near(hcol,hrow,d)
+
+    def solid_near(self,hcol,hrow,d):
+        """scan_solid() as (col,row,cellcode)"""
+        hexes = self.hexes
+        return [(hc,hr,hexes[hc,hr])
+                for hc,hr,hx,hy in self.scan_solid(hcol,hrow,d)]
+
+    def scan_solid(self,hcol,hrow,d):
+        """Solid hexes in the square of columns and rows within d
+        of hcol,hrow, as (col,row,x,y) where x,y is the centre"""
+        c0,r0 = self.grid_origin
+        w,h = self.grid_size
+        solid = self.solid
+        R3, Sin60 = collision.R3, collision.Sin60
+        vlo = max(hrow - d - r0, 0)
+        vhi = min(hrow + d + 1 - r0, h)
+        near = []
+        if vhi <= vlo:
+            return near # all above or below the grid
+        for u in range(max(hcol - d - c0, 0), min(hcol + d + 1 - c0, w)):
+            column = solid[u * h + vlo:u * h + vhi]
+            if not any(column):
+                continue
+            hc = u + c0
+            hx = hc * 1.5
+            for i,s in enumerate(column):
+                if s:
+                    hr = vlo + i + r0
+                    near.append((hc,hr,hx,hr * R3 + Sin60 * (hc % 2)))
+        return near
+
+    # Cache of solid hexes near each cell, for obstacles_near()
+    cache_neighbourhoods = True
+
+    def clear_neighbourhoods(self):
+        self.neighbourhoods = {} # {(d,col,row):[(col,row,cellcode)]}
+        self.neighbourhood_reach = set()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def invalidate_neighbourhoods(self,hc,hr):
+        """Forget the cached neighbourhoods that include hc,hr"""
+        pop = self.neighbourhoods.pop
+        for d in self.neighbourhood_reach:
+            for c in range(hc - d, hc + d + 1):
+                for r in range(hr - d, hr + d + 1):
+                    pop((d,c,r),None)
+
+    def cache_hit_rate(self):
+        """Fraction of obstacles_near() calls answered from the
+        neighbourhood cache"""
+        total = self.cache_hits + self.cache_misses
+        return self.cache_hits / float(total) if total else 0.0
 
-    def obstacles_near(self,x,y):
-        return [(hc,hr,self.hexes[hc,hr])
-                for hc,hr in collision.nearest_neighbours(x,y,2)
-                if self.hexes.get((hc,hr)," ") not in " SXOP"]
-    
     def hexpoints(self,hex):
         p = HEXPOINTS.get(hex)
         if p:
@@ -126,7 +316,7 @@ class Level:
                 s = "crunch"
         if not points:
             return False
-        self.hexes[hc,hr] = " "
+        self[hc,hr] = " "
         return (points,s)
 
     def collect(self,hc,hr):
@@ -134,22 +324,93 @@ class Level:
         Return None if nothing there"""
         p = self.powerups.get((hc,hr))
         if p:
-            self.hexes[hc,hr] = " "
+            self[hc,hr] = " "
             del self.powerups[hc,hr]
         return p
             
 
         
-def load_level(fname):
+def chunk_of(hc,hr,size=CHUNK_SIZE):
+    """The key of the chunk that the cell at hc,hr is in"""
+    return hc // size, hr // size
+
+def empty_chunk():
+    return dict(hexes={},monsters={},powerups={})
+
+class LevelChunks(object):
+    """A level saved with Level.save_chunks(), whose chunks are
+    read from the file when they are wanted"""
+    def __init__(self,f,header,fname):
+        self.file = f
+        self.fname = fname
+        self.header = header
+        self.size = header["chunk_size"]
+        self.index = header["chunks"]
+        self.data_start = f.tell()
+        self.reads = 0
+
+    def level(self):
+        """The Level without any of its chunks: just its name,
+        story, start, exit and so on"""
+        return Level(dict((k,v) for k,v in self.header.items()
+                          if k not in ("chunk_size","chunks")))
+
+    def read(self,key):
+        """The hexes, monsters and powerups of the chunk key"""
+        where = self.index.get(key)
+        if where is None:
+            return empty_chunk()
+        offset,length = where
+        self.file.seek(self.data_start + offset)
+        self.reads += 1
+        return pickle.loads(self.file.read(length))
+
+    def read_all(self):
+        """The whole level representation"""
+        d = dict((k,v) for k,v in self.header.items()
+                 if k not in ("chunk_size","chunks"))
+        for part in ("hexes","monsters","powerups"):
+            d[part] = {}
+        for key in sorted(self.index):
+            for part,cells in self.read(key).items():
+                d[part].update(cells)
+        return d
+
+    def close(self):
+        self.file.close()
+
+def open_level_file(fname):
+    """A level file, from the resource path or else from the
+    current directory, or None if there isn't one"""
     try:
-        with resource.file(fname,"rb") as f:
-            return Level(pickle.load(f))
+        return resource.file(fname,"rb")
     except resource.ResourceNotFoundException:
         try:
-            with open(fname,"rb") as f:
-                return Level(pickle.load(f))
+            return open(fname,"rb")
         except IOError:
             return None
+
+def open_chunks(fname):
+    """LevelChunks of a chunked level file, or None if there is
+    no such file or it isn't chunked"""
+    f = open_level_file(fname)
+    if f is None:
+        return None
+    header = pickle.load(f)
+    if "chunk_size" not in header:
+        f.close()
+        return None
+    return LevelChunks(f,header,fname)
+
+def load_level(fname):
+    f = open_level_file(fname)
+    if f is None:
+        return None
+    with f:
+        d = pickle.load(f)
+        if "chunk_size" in d:
+            d = LevelChunks(f,d,fname).read_all()
+        return Level(d)
  
  
 
@@ -12,6 +12,7 @@ from tdgl.gl import tdgl_usual_setup
 from pygame import mixer
 
 options = None
+recorder = None
 
 import sounds
 
@@ -27,10 +28,29 @@ def main():
     add("--fps",default=60,type="int",
         help="Maximum fps [ %default ]")
     add("--time",default=False,action="store_true",
-        help="Show timings (inluding actual fps)")
+        help="Show timings (inluding actual fps), and how balls"
+        " were reused at the end of each level")
     add("--test-level",default=None,type="int")
-    global options
+    add("--sim-rate",default=100,type="int",
+        help="Simulation steps per second, independent of fps"
+        " (0 to step once per frame) [ %default ]")
+    add("--swept",default=False,action="store_true",
+        help="Exact swept collisions, so fast balls stay"
+        " correct at low fps")
+    add("--lod",default=False,action="store_true",
+        help="Move monsters far from the player less often")
+    add("--fog",default=False,action="store_true",
+        help="Only show what the player can see")
+    add("--seed",default=None,type="int",
+        help="Seed for the monsters' random numbers")
+    add("--record",default=None,metavar="FILE",
+        help="Record each level played to a replay file"
+        " (see replay.py)")
+    global options, recorder
     options,args = op.parse_args()
+    if options.record:
+        import replay
+        recorder = replay.Recorder(options.record)
     pyglet.clock.set_fps_limit(options.fps)
 
     if options.fullscreen:
@@ -0,0 +1,411 @@
+"""
+ Hierarchical path finding, for levels too big for a flow field
+
+ The level's grid is cut into square clusters of cells (in col,row
+ coordinates).  Where walkable cells of two neighbouring clusters
+ touch, one or two pairs of cells on each connected stretch of the
+ border are chosen as entrances.  The entrances are the nodes of a
+ small abstract graph, with:
+
+   - an edge of cost 1 across each border, between the two cells
+     of each entrance, and
+   - an edge between each two entrances of the same cluster that
+     can reach each other inside it, costing the number of steps.
+
+ A path query joins the start and goal to the entrances of their
+ clusters, searches the abstract graph with A*, and then fills in
+ the steps inside each cluster.  The searches of the cells only ever
+ look at one cluster at a time, and each is remembered until its
+ cluster changes, so one monster asking again from the same cell
+ doesn't search again.  The paths found are nearly, but not always
+ exactly, the shortest.
+
+ For many monsters heading for the same goal (the player, say),
+ next_step() searches the abstract graph once out from the goal, and
+ remembers the cost to the goal from every entrance until the index
+ changes.  Then each monster only has to look at the entrances of
+ its own cluster.
+
+ When a cell changes (a hexagon is destroyed), only its cluster is
+ rebuilt: the entrances on its borders and the links between them.
+ Its neighbours just link any new entrances on their side.  If the
+ level's grid is built again (e.g. chunks of a streamed level come
+ and go), the whole index is built again when next used.
+"""
+import heapq
+from collections import deque
+
+import hexgrid
+
+FAR = 1 << 30
+
+# (column,row) steps to the neighbours, from even and odd columns
+STEPS = [[(nc - c,nr) for nc,nr in hexgrid.neighbours(c,0)] for c in (0,1)]
+
+class PathIndex(object):
+    max_searches = 4096 # searches remembered before starting afresh
+    max_trees = 4       # goals next_step() remembers the way to
+
+    def __init__(self,level,cluster_size=8):
+        self.level = level
+        self.size = cluster_size
+        self.rebuilds = 0
+        self.repairs = 0
+        self.build()
+
+    # Cells and clusters
+
+    def cluster(self,cell):
+        s = self.size
+        return cell[0] // s, cell[1] // s
+
+    def passable(self,cell):
+        level = self.level
+        i = level.grid_index(*cell)
+        return i is not None and not level.solid[i]
+
+    def cluster_keys(self):
+        s = self.size
+        c0,r0 = self.grid_origin
+        w,h = self.grid_size
+        return [(kx,ky)
+                for kx in range(c0 // s,(c0 + w - 1) // s + 1)
+                for ky in range(r0 // s,(r0 + h - 1) // s + 1)]
+
+    def neighbour_clusters(self,key):
+        kx,ky = key
+        found = []
+        for dx in (-1,0,1):
+            for dy in (-1,0,1):
+                k = kx + dx, ky + dy
+                if k != key and k in self.entrances:
+                    found.append(k)
+        return found
+
+    def cluster_cells(self,key):
+        s = self.size
+        c0,r0 = self.grid_origin
+        w,h = self.grid_size
+        kx,ky = key
+        for hc in range(max(kx * s,c0),min(kx * s + s,c0 + w)):
+            for hr in range(max(ky * s,r0),min(ky * s + s,r0 + h)):
+                yield hc,hr
+
+    def local_search(self,start):
+        """Breadth-first search from start, inside its cluster.
+        Return ({cell:steps},{cell:previous cell})"""
+        s = self.size
+        gc,gr = self.grid_origin
+        w,h = self.grid_size
+        # the cluster, cut down to the part on the grid
+        c0 = max(start[0] // s * s,gc)
+        r0 = max(start[1] // s * s,gr)
+        c1 = min(start[0] // s * s + s,gc + w)
+        r1 = min(start[1] // s * s + s,gr + h)
+        solid = self.level.solid
+        dist = {start:0}
+        came_from = {}
+        queue = deque([start])
+        while queue:
+            cell = queue.popleft()
+            hc,hr = cell
+            d = dist[cell] + 1
+            for dc,dr in STEPS[hc & 1]:
+                nc,nr = hc + dc,hr + dr
+                if (c0 <= nc < c1 and r0 <= nr < r1
+                    and not solid[(nc - gc) * h + nr - gr]):
+                    n = nc,nr
+                    if n not in dist:
+                        dist[n] = d
+                        came_from[n] = cell
+                        queue.append(n)
+        return dist,came_from
+
+    def search(self,cell):
+        """local_search(cell), remembered until its cluster changes"""
+        found = self.searches.get(cell)
+        if found is None:
+            if len(self.searches) >= self.max_searches:
+                self.searches = {}
+            found = self.searches[cell] = self.local_search(cell)
+        return found
+
+    # Building and repairing the abstract graph
+
+    def build(self):
+        level = self.level
+        self.grid = level.solid
+        self.grid_origin = level.grid_origin
+        self.grid_size = level.grid_size
+        self.rebuilds += 1
+        keys = self.cluster_keys()
+        self.entrances = dict((k,set()) for k in keys) # {cluster:set(cell)}
+        self.borders = {}  # {(cluster,cluster):[(cell,cell)]}
+        self.edges = {}    # {cell:{cell:cost}}
+        self.searches = {} # {cell:local_search(cell)}
+        self.trees = {}    # {goal:goal_tree(goal)}
+        for k in keys:
+            for n in self.neighbour_clusters(k):
+                if k < n:
+                    self.find_border(k,n)
+        for k in keys:
+            self.link_cluster(k)
+
+    def check(self):
+        if self.grid is not self.level.solid:
+            self.build()
+
+    def find_border(self,k1,k2):
+        """Choose the entrances between clusters k1 and k2 (k1 < k2)"""
+        s = self.size
+        gc,gr = self.grid_origin
+        w,h = self.grid_size
+        solid = self.level.solid
+        (kx1,ky1),(kx2,ky2) = k1,k2
+        pairs = []
+        # only the cells of k1 within a step of k2 can cross to it
+        for hc in range(max(kx1 * s,kx2 * s - 1,gc),
+                        min(kx1 * s + s,kx2 * s + s + 1,gc + w)):
+            for hr in range(max(ky1 * s,ky2 * s - 1,gr),
+                            min(ky1 * s + s,ky2 * s + s + 1,gr + h)):
+                if solid[(hc - gc) * h + hr - gr]:
+                    continue
+                for dc,dr in STEPS[hc & 1]:
+                    nc,nr = hc + dc,hr + dr
+                    if (nc // s == kx2 and nr // s == ky2
+                        and gc <= nc < gc + w and gr <= nr < gr + h
+                        and not solid[(nc - gc) * h + nr - gr]):
+                        pairs.append(((hc,hr),(nc,nr)))
+        chosen = []
+        for run in self.stretches(pairs):
+            run.sort()
+            if len(run) >= 6:
+                chosen.append(run[0])
+                chosen.append(run[-1])
+            else:
+                chosen.append(run[len(run) // 2])
+        for a,b in chosen:
+            self.entrances[k1].add(a)
+            self.entrances[k2].add(b)
+            self.edges.setdefault(a,{})[b] = 1
+            self.edges.setdefault(b,{})[a] = 1
+        self.borders[k1,k2] = chosen
+
+    def stretches(self,pairs):
+        """Group crossing pairs into connected stretches of border,
+        where the cells on both sides are next to each other"""
+        def close(p,q):
+            return hexgrid.hex_distance(p[0],p[1],q[0],q[1]) <= 1
+        groups = []
+        for pair in pairs:
+            joined = [g for g in groups
+                      if any(close(pair[0],a) and close(pair[1],b)
+                             for a,b in g)]
+            merged = [pair]
+            for g in joined:
+                merged.extend(g)
+                groups.remove(g)
+            groups.append(merged)
+        return groups
+
+    def link_cluster(self,key):
+        """Join up the entrances of a cluster that can reach
+        each other inside it"""
+        cluster = self.cluster
+        entrances = self.entrances[key]
+        for e in entrances:
+            edges = self.edges.setdefault(e,{})
+            for n in [n for n in edges if cluster(n) == key]:
+                del edges[n]
+        searches = self.searches
+        for cell in self.cluster_cells(key):
+            searches.pop(cell,None)
+        for e in entrances:
+            dist,came_from = self.local_search(e)
+            edges = self.edges[e]
+            for e2 in entrances:
+                if e2 != e and e2 in dist:
+                    edges[e2] = dist[e2]
+
+    def link_new(self,key,new):
+        """Join new entrances of a cluster, whose cells haven't
+        changed, to its other entrances"""
+        entrances = self.entrances[key]
+        edges = self.edges
+        for e in new:
+            dist,came_from = self.local_search(e)
+            for e2 in entrances:
+                if e2 != e and e2 in dist:
+                    edges[e][e2] = edges[e2][e] = dist[e2]
+
+    def forget_entrance(self,cell):
+        """Remove an entrance that no longer crosses any border"""
+        for n in self.edges.pop(cell,{}):
+            self.edges.get(n,{}).pop(cell,None)
+        self.entrances[self.cluster(cell)].discard(cell)
+
+    def cell_changed(self,hc,hr):
+        """Repair the index after the cell at hc,hr has changed,
+        e.g. its hexagon has been destroyed"""
+        if self.grid is not self.level.solid:
+            self.build()
+            return
+        self.repairs += 1
+        self.trees = {}
+        cluster = self.cluster
+        key = cluster((hc,hr))
+        near = self.neighbour_clusters(key)
+        loose = set()
+        for n in near:
+            pair = min(key,n),max(key,n)
+            for a,b in self.borders.pop(pair,()):
+                self.edges.get(a,{}).pop(b,None)
+                self.edges.get(b,{}).pop(a,None)
+                loose.add(a)
+                loose.add(b)
+        for cell in loose:
+            ck = cluster(cell)
+            if not any(cluster(n) != ck for n in self.edges.get(cell,())):
+                self.forget_entrance(cell)
+        before = dict((n,set(self.entrances[n])) for n in near)
+        for n in near:
+            self.find_border(min(key,n),max(key,n))
+        self.link_cluster(key)
+        for n in near:
+            self.link_new(n,self.entrances[n] - before[n])
+
+    # Queries
+
+    def abstract_path(self,start,goal):
+        """(cost, [start, entrance, ..., goal]) of the cheapest way
+        through the abstract graph, or (FAR, None)"""
+        self.check()
+        if not (self.passable(start) and self.passable(goal)):
+            return FAR,None
+        if start == goal:
+            return 0,[start]
+        ks = self.cluster(start)
+        from_start,_ = self.search(start)
+        to_goal,_ = self.search(goal)
+        # hexgrid.hex_distance() to the goal, half worked out here
+        gq = goal[0]
+        gr = goal[1] - (gq >> 1)
+        def heuristic(cell):
+            dq = gq - cell[0]
+            dr = gr - cell[1] + (cell[0] >> 1)
+            return (abs(dq) + abs(dq + dr) + abs(dr)) // 2
+        edges = self.edges
+        best = {start:0}
+        came_from = {}
+        queue = [(heuristic(start),0,start)]
+        while queue:
+            f,g,node = heapq.heappop(queue)
+            if node == goal:
+                path = [goal]
+                while path[-1] != start:
+                    path.append(came_from[path[-1]])
+                path.reverse()
+                return g,path
+            if g > best.get(node,FAR):
+                continue
+            if node == start:
+                links = [(e,from_start[e]) for e in self.entrances[ks]
+                         if e in from_start]
+                if goal in from_start:
+                    links.append((goal,from_start[goal]))
+                # an entrance can cross the border itself
+                links.extend(edges.get(start,{}).items())
+            else:
+                links = list(edges.get(node,{}).items())
+                if node in to_goal:
+                    links.append((goal,to_goal[node]))
+            for n,cost in links:
+                g2 = g + cost
+                if g2 < best.get(n,FAR):
+                    best[n] = g2
+                    came_from[n] = node
+                    heapq.heappush(queue,(g2 + heuristic(n),g2,n))
+        return FAR,None
+
+    def goal_tree(self,goal):
+        """Cheapest costs through the abstract graph to goal, from
+        goal itself and every entrance that can reach it, as
+        ({cell:cost},{cell:next cell on the way})"""
+        to_goal,_ = self.search(goal)
+        kg = self.cluster(goal)
+        edges = self.edges
+        cost = {goal:0}
+        via = {}
+        queue = [(0,goal)]
+        while queue:
+            g,node = heapq.heappop(queue)
+            if g > cost[node]:
+                continue
+            if node == goal:
+                links = [(e,to_goal[e]) for e in self.entrances[kg]
+                         if e in to_goal]
+                links.extend(edges.get(goal,{}).items())
+            else:
+                links = edges.get(node,{}).items()
+            for n,step in links:
+                g2 = g + step
+                if g2 < cost.get(n,FAR):
+                    cost[n] = g2
+                    via[n] = node
+                    heapq.heappush(queue,(g2,n))
+        return cost,via
+
+    def tree(self,goal):
+        """goal_tree(goal), remembered until the index changes"""
+        found = self.trees.get(goal)
+        if found is None:
+            if len(self.trees) >= self.max_trees:
+                self.trees = {}
+            found = self.trees[goal] = self.goal_tree(goal)
+        return found
+
+    def segment(self,a,b):
+        """Cells from a to b, one step of an abstract path"""
+        if self.cluster(a) != self.cluster(b):
+            return [a,b]
+        dist,came_from = self.search(a)
+        path = [b]
+        while path[-1] != a:
+            path.append(came_from[path[-1]])
+        path.reverse()
+        return path
+
+    def path(self,start,goal):
+        """List of cells from start to goal, or None if there's no way"""
+        cost,nodes = self.abstract_path(start,goal)
+        if nodes is None:
+            return None
+        cells = [start]
+        for a,b in zip(nodes,nodes[1:]):
+            cells.extend(self.segment(a,b)[1:])
+        return cells
+
+    def next_step(self,start,goal):
+        """The next cell on the way from start to goal, or None.
+        Only the first step of the path is filled in, and the way
+        to goal is remembered for the next start (see goal_tree)."""
+        self.check()
+        if (start == goal
+            or not (self.passable(start) and self.passable(goal))):
+            return None
+        cost,via = self.tree(goal)
+        from_start,_ = self.search(start)
+        best,to = FAR,None
+        if goal in from_start:
+            best,to = from_start[goal],goal
+        for e in self.entrances[self.cluster(start)]:
+            if e in from_start and e in cost:
+                g = from_start[e] + cost[e]
+                if g < best:
+                    best,to = g,e
+        if to is None:
+            return None
+        if to == start:
+            # an entrance: on to the next node, maybe over the border
+            to = via[start]
+        return self.segment(start,to)[1]
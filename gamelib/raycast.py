@@ -0,0 +1,127 @@
+"""
+ Rays over the hexagon grid
+
+ cells_along() walks a line segment through the hexagons it passes
+ through, in order, by working out which side of each hexagon the
+ segment leaves by, and stepping into the neighbour on that side.
+ raycast() follows a segment until it reaches a solid hexagon (as
+ in Level.is_solid) and says where it hit and which way the side it
+ hit faces: for aiming, or whether one thing can see another.
+
+ raycast_array() does the same for many segments at once with numpy
+ arrays, stepping every ray one hexagon at a time together.  It
+ gives exactly the same answers as raycast().
+
+ Hexagons have corners 1 from their centres (see collision.py), so
+ each side is Sin60 from the centre, and H_NORMAL[i] is the normal
+ of the side shared with hexgrid.neighbour(col,row,i).
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import collision
+import hexgrid
+
+SIDES = [(n.x,n.y) for n in collision.H_NORMAL]
+INRADIUS = hexgrid.Sin60
+
+def cells_along(x0,y0,x1,y1):
+    """Yield (col,row,t,side) for each hexagon that the segment from
+    x0,y0 to x1,y1 passes through, in order.  t is how far along the
+    segment (0 to 1) it enters the hexagon, and side is the side of
+    the hexagon before that it left by (None for the first)"""
+    dx,dy = x1 - x0, y1 - y0
+    col,row = hexgrid.pixel_to_hex(x0,y0)
+    t,side = 0.0,None
+    while True:
+        yield col,row,t,side
+        cx,cy = hexgrid.hex_centre(col,row)
+        px,py = x0 - cx, y0 - cy
+        best = None
+        for i,(nx,ny) in enumerate(SIDES):
+            nd = nx * dx + ny * dy
+            if nd > 0:
+                s = (INRADIUS - (nx * px + ny * py)) / nd
+                if best is None or s < best:
+                    best,side = s,i
+        if best is None or best >= 1.0:
+            return
+        t = best
+        col,row = hexgrid.neighbour(col,row,side)
+
+def raycast(level,x0,y0,x1,y1):
+    """The first solid hexagon on the segment from x0,y0 to x1,y1, as
+    ((col,row), (x,y) where the segment hits it, (nx,ny) the normal
+    of the side it hits), or None if it doesn't reach one.  If x0,y0
+    is inside a solid hexagon, that is the one hit, at x0,y0, and the
+    normal is None."""
+    solid = level.solid
+    grid_index = level.grid_index
+    for col,row,t,side in cells_along(x0,y0,x1,y1):
+        i = grid_index(col,row)
+        if i is not None and solid[i]:
+            if side is None:
+                return (col,row),(x0,y0),None
+            nx,ny = SIDES[side]
+            return ((col,row),(x0 + (x1 - x0) * t,y0 + (y1 - y0) * t),
+                    (-nx,-ny))
+    return None
+
+def raycast_array(level,x0,y0,x1,y1):
+    """raycast() of many segments at once, from numpy arrays of their
+    ends.  Return arrays (hit, cols, rows, x, y, nx, ny): whether each
+    segment hits a solid hexagon, and if it does, which one, where
+    and the normal of the side it hits (0,0 if it starts inside)"""
+    x0 = numpy.asarray(x0,dtype=float)
+    y0 = numpy.asarray(y0,dtype=float)
+    dx = numpy.asarray(x1,dtype=float) - x0
+    dy = numpy.asarray(y1,dtype=float) - y0
+    n = len(x0)
+    cols,rows = hexgrid.pixel_to_hex_array(x0,y0)
+    q = cols.copy()
+    r = rows - (cols >> 1)
+    t = numpy.zeros(n)
+    side = -numpy.ones(n,dtype=int)
+    hit = numpy.zeros(n,dtype=bool)
+    solid = numpy.frombuffer(level.solid,dtype=numpy.uint8)
+    c0,r0 = level.grid_origin
+    w,h = level.grid_size
+    SX = numpy.array([nx for nx,ny in SIDES])
+    SY = numpy.array([ny for nx,ny in SIDES])
+    DQ = numpy.array([dq for dq,dr in hexgrid.DIRECTIONS])
+    DR = numpy.array([dr for dq,dr in hexgrid.DIRECTIONS])
+    live = numpy.arange(n)
+    while len(live):
+        col = q[live]
+        row = r[live] + (col >> 1)
+        u,v = col - c0,row - r0
+        inside = (u >= 0) & (u < w) & (v >= 0) & (v < h)
+        here = numpy.zeros(len(live),dtype=bool)
+        here[inside] = solid[(u * h + v)[inside]] != 0
+        hit[live[here]] = True
+        cols[live] = col
+        rows[live] = row
+        live = live[~here]
+        col,row = col[~here],row[~here]
+        px = x0[live] - col * 1.5
+        py = y0[live] - (row * hexgrid.R3 + hexgrid.Sin60 * (col % 2))
+        nd = SX * dx[live][:,None] + SY * dy[live][:,None]
+        ahead = nd > 0
+        s = numpy.where(ahead,
+                        (INRADIUS - (SX * px[:,None] + SY * py[:,None]))
+                        / numpy.where(ahead,nd,1.0),
+                        numpy.inf)
+        k = s.argmin(axis=1)
+        best = s[numpy.arange(len(live)),k]
+        going = best < 1.0
+        live,k,best = live[going],k[going],best[going]
+        t[live] = best
+        side[live] = k
+        q[live] += DQ[k]
+        r[live] += DR[k]
+    crossed = hit & (side >= 0)
+    nx = numpy.where(crossed,-SX[side],0.0)
+    ny = numpy.where(crossed,-SY[side],0.0)
+    return (hit,cols,rows,x0 + dx * t,y0 + dy * t,nx,ny)
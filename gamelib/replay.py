@@ -0,0 +1,185 @@
+#! /usr/bin/env python
+"""
+   Record the inputs to a game, and play them back without a window.
+
+   A World only changes through World.step(ms,inputs), and its random
+   numbers come from a stream seeded per level, so recording the seed,
+   the starting level and the ms and Inputs of every step is enough to
+   play a level again exactly as it went.
+
+   A replay file is a pickled list of level records:
+
+    {"version": 1,
+     "level": level definition (see levelfile.Level.as_dict),
+     "levelnum", "score", "ammo", "seed", "swept", "lod": as for World(),
+     "stream": (file name, radius) of a chunked level that was
+               streamed (see streaming.py), or None,
+     "special": name of the special ball class, or None,
+     "ticks": [(count,tick)] for count repeats of each tick,
+     "final": world_state() at the end,
+    }
+
+   where each tick is (ms,move,face,fire,launch,give_up), with
+   the vectors stored as (x,y).  Most ticks are the same as the one
+   before (the same keys held down) so they are run-length encoded.
+
+   Run from the gamelib directory:
+
+     python replay.py replayfile ...
+
+   to play each recorded level as fast as possible and check that
+   it ends the same way.
+"""
+import sys
+import pickle
+import zlib
+from timeit import default_timer
+
+from tdgl.vec import Vec
+import bodies
+import levelfile
+import streaming
+import world
+
+VERSION = 1
+
+def encode_inputs(ms,inputs):
+    """Compact tuple for one step's inputs"""
+    move = inputs.move
+    return (ms,
+            (move.x,move.y) if (move.x or move.y) else None,
+            inputs.face,
+            tuple((v.x,v.y,special) for v,special in inputs.fire),
+            tuple((v.x,v.y) for v in inputs.launch),
+            inputs.give_up)
+
+def decode_inputs(tick):
+    """(ms,Inputs) from a tuple made by encode_inputs()"""
+    ms,move,face,fire,launch,give_up = tick
+    return ms, world.Inputs(
+        move=Vec(*move) if move else None,
+        face=face,
+        fire=[(Vec(x,y),special) for x,y,special in fire],
+        launch=[Vec(x,y) for x,y in launch],
+        give_up=give_up)
+
+def world_state(w):
+    """Summary of a World, for checking that a replay ended
+    the same way as the game that was recorded"""
+    hexes = repr(sorted(w.level.hexes.items()))
+    return dict(
+        mode=w.mode,
+        score=w.score,
+        dying_of=w.dying_of,
+        ammo=w.special_ammo,
+        special=w.special_ball and w.special_ball.__name__,
+        player=repr(tuple(w.player.pos)),
+        monsters=[(m.name,repr(tuple(m.pos))) for m in w.monsters],
+        balls=len(w.balls),
+        hexes=zlib.crc32(hexes) & 0xffffffff)
+
+
+class Recorder(object):
+    """Records each level played into a replay file, which is
+    rewritten as each level ends"""
+    def __init__(self,fname):
+        self.fname = fname
+        self.levels = []
+        self.current = None
+
+    def start(self,w):
+        """Start recording a World, before its first step"""
+        self.current = dict(
+            version=VERSION,
+            level=w.level.as_dict(),
+            levelnum=w.levelnum,
+            score=w.score,
+            ammo=w.special_ammo,
+            special=w.special_ball and w.special_ball.__name__,
+            seed=w.seed,
+            swept=w.swept,
+            lod=w.lod,
+            stream=w.stream and (w.stream.chunks.fname,w.stream.radius),
+            ticks=[])
+
+    def record(self,ms,inputs):
+        ticks = self.current["ticks"]
+        tick = encode_inputs(ms,inputs)
+        if ticks and ticks[-1][1] == tick:
+            ticks[-1][0] += 1
+        else:
+            ticks.append([1,tick])
+
+    def finish(self,w):
+        """Stop recording, and save everything recorded so far"""
+        rec = self.current
+        if rec is None:
+            return
+        rec["ticks"] = [tuple(t) for t in rec["ticks"]]
+        rec["final"] = world_state(w)
+        self.levels.append(rec)
+        self.current = None
+        save(self.fname,self.levels)
+
+def save(fname,levels):
+    with open(fname,"wb") as f:
+        pickle.dump(levels,f,-1)
+
+def load(fname):
+    with open(fname,"rb") as f:
+        return pickle.load(f)
+
+def make_world(rec):
+    """A World in the state it was when rec was started"""
+    special = rec["special"]
+    if rec.get("stream"):
+        fname,radius = rec["stream"]
+        chunks = levelfile.open_chunks(fname)
+        level = chunks.level()
+        stream = streaming.LevelStream(chunks,radius)
+    else:
+        level = levelfile.Level(rec["level"])
+        stream = None
+    return world.World(level,
+                       rec["levelnum"],rec["score"],rec["ammo"],
+                       special and getattr(bodies,special),
+                       swept=rec["swept"],seed=rec["seed"],
+                       lod=rec.get("lod",False),stream=stream)
+
+def play(rec):
+    """Play a recorded level from start to finish.
+    Return (world, number of steps)"""
+    w = make_world(rec)
+    steps = 0
+    for count,tick in rec["ticks"]:
+        ms,inputs = decode_inputs(tick)
+        for i in range(count):
+            w.step(ms,inputs)
+        steps += count
+    return w,steps
+
+def verify(rec):
+    """Play a recorded level, and return (steps, seconds, list of
+    the parts of the final state that don't match)"""
+    t0 = default_timer()
+    w,steps = play(rec)
+    secs = default_timer() - t0
+    final = world_state(w)
+    expected = rec["final"]
+    wrong = [k for k in sorted(expected) if final.get(k) != expected[k]]
+    return steps,secs,wrong
+
+def main(fnames):
+    ok = True
+    for fname in fnames:
+        for i,rec in enumerate(load(fname)):
+            steps,secs,wrong = verify(rec)
+            rate = steps / secs if secs else float('inf')
+            print "{0}[{1}] level {2}: {3} steps in {4:.3f}s ({5:.0f}/s) {6}".format(
+                fname,i,rec["levelnum"],steps,secs,rate,
+                "MISMATCH " + ",".join(wrong) if wrong else "ok")
+            ok = ok and not wrong
+    return ok
+
+if __name__ == '__main__':
+    sys.exit(0 if main(sys.argv[1:]) else 1)
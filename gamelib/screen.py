@@ -5,10 +5,9 @@ The game is divided into Screens
 """
 from __future__ import division
 import pickle
-import random
 import pyglet
 from pyglet.window import key as pygletkey
-from math import atan2,degrees,radians,sin,cos
+from math import radians,sin,cos
 
 from tdgl.gl import *
 from tdgl import part, picking, panel, stylesheet, lighting, objpart
@@ -17,11 +16,13 @@ from tdgl.vec import Vec
 
 import graphics
 import collision
+import hexgrid
+import world
 import levelfile
 import monsters
+import streaming
 import main # for options
-from graphics import ClockPart, Ball, Player, StoryPanel, ScreenBorder
-from graphics import BlitzBall, BowlingBall, SpikeBall, HappyBall
+from graphics import ClockPart, Player, StoryPanel, ScreenBorder
 import sounds
 
 class Screen(part.Group):
@@ -51,6 +52,9 @@ class Screen(part.Group):
         self.build_parts(**kw)
         stylesheet.load(self._screen_styles)
         self.restyle(True)
+        self.start_music()
+
+    def start_music(self):
         if self.music != Screen.last_music:
             if self.music:
                 sounds.music_start(self.music)
@@ -75,6 +79,8 @@ class Screen(part.Group):
 
     def setup_geom(self): pass
     def setdown_geom(self): pass
+    def begin_interpolation(self,alpha): pass
+    def end_interpolation(self): pass
     def build_parts(self,**kw): pass
     def keydown(self,sym,mods): pass
     def keyup(self,sym,mods): pass
@@ -108,7 +114,10 @@ class Screen(part.Group):
 
 
 class GameScreen(Screen):
+    """Shows a world.World being played, and turns the player's
+    key presses and mouse clicks into its Inputs"""
     music = "gameplay"
+    warm_ball_count = 8 # of each kind the player has, made in advance
     _screen_styles = {
         "#player":{"obj-filename":"thedetective.obj",
                    "obj-pieces":["Body","Hat","Feet0","Eyes"],
@@ -117,19 +126,42 @@ class GameScreen(Screen):
         }
 
     def __init__(self,name="",level=None,levelnum=1,score=0,
-                 ammo=0,special=None, **kw):
+                 ammo=0,special=None,seed=None, **kw):
         if not level:
             level = self.find_level(levelnum)
+        if isinstance(level,levelfile.LevelChunks):
+            stream = streaming.LevelStream(level)
+            level = level.level()
+        else:
+            stream = None
         self.level = level
         self.levelnum = levelnum
-        self.score = score
+        if seed is None:
+            seed = main.options.seed
+        self.world = world.World(level,levelnum,score,ammo,special,
+                                 swept=main.options.swept,seed=seed,
+                                 lod=main.options.lod,
+                                 stream=stream)
+        self.recorder = main.recorder
+        if self.recorder:
+            self.recorder.start(self.world)
         self.light = lighting.claim_light()
         stylesheet.load(monsters.MonsterStyles)
         stylesheet.load(graphics.BallStyles)
         if level.music:
             self.music = level.music
-        self.special_ammo = ammo
-        self.special_ball = special
+        self.last_places = {}
+        self.drawn_places = {}
+        self.fire_queue = []
+        self.launch_queue = []
+        self.give_up = False
+        self.fog_version = None # of the world's field of view shown
+        self.monster_parts = {} # {body:part}, to show again on restore
+        if stream is None:
+            self.level_start = self.world.snapshot() # for retry()
+        else:
+            self.level_start = None
+        self.quick_save = None
         super(GameScreen,self).__init__(name,**kw)
         self.set_mode("story" if self.story_page is not None
                       else "playing")
@@ -154,7 +186,6 @@ class GameScreen(Screen):
         vport = (GLint*4)()
         glGetIntegerv(GL_VIEWPORT, vport)
         self.vport = tuple(vport)
-        self.reload = 0
         sounds.play(self.level.sound)
             
     def __del__(self):
@@ -164,20 +195,22 @@ class GameScreen(Screen):
         self.mode = mode
 
     def find_level(self,levelnum):
+        """The Level, or the LevelChunks of a chunked level"""
         fname = "level{0:02}.lev".format(levelnum)
-        return levelfile.load_level(fname)
+        return levelfile.open_chunks(fname) or levelfile.load_level(fname)
 
     def build_parts(self,**kw):
         level = self.level
-        if self.special_ball:
-            ammo_name = self.special_ball.__name__
+        world = self.world
+        if world.special_ball:
+            ammo_name = world.special_ball.__name__
         else:
             ammo_name = None
         border = ScreenBorder(
             "hud",
             title=level.name,
-            score=self.score,
-            ammo=self.special_ammo,
+            score=world.score,
+            ammo=world.special_ammo,
             ammo_name=ammo_name,
             style=dict(fg=level.fg,bg=level.bg,bd=level.bd))
         ov = OrthoView("frame", [border],
@@ -194,16 +227,15 @@ class GameScreen(Screen):
             self.story_page = None
         self.append(ov)
         hf = graphics.HexagonField("hexfield",self.level)
-        pu,pv = level.start
-        self.player_exit = level.exit
-        x,y = graphics.hex_to_world_coords(pu,pv)
-        player = Player(name="player",
-            geom=dict(pos=(x,y,0),radius=0.49))
+        x,y,z = world.player.pos
+        player = Player(name="player",body=world.player)
         self.player = player
         self.hexfield = hf
         balls = part.Group("balls",[])
+        self.ball_pool = graphics.BallPool()
+        self.warm_balls()
         monsters = part.Group("monsters",
-                              self.build_monsters(self.level))
+                              self.build_monsters(world))
         powerups = part.Group("powerups",
                               self.build_powerups(self.level))
         sv = SceneView("scene",[monsters,hf,player,balls,powerups])
@@ -219,26 +251,42 @@ class GameScreen(Screen):
         lighting.light_switch(self.light,True)
         self.append(sv)
         
-    def build_monsters(self,level):
-        ms = []
-        count = 0
-        for coords, classname in level.monsters.items():
-            pos = collision.h_centre(*coords)
-            M = getattr(monsters,classname,monsters.Monster)
-            if classname == "Hunter" or coords == level.exit:
-                vel = Vec(0,0)
-            else: # random direction and speed
-                vel = (random.choice(collision.H_NORMAL) *
-                       random.gauss(M.speed,0.02) * 0.01)
-            m = M("{0}{1}".format(classname,count),
-                  velocity=vel,
-                  geom=dict(pos=pos,angle=0))
-            if classname == "Balrog":
-                # The Balrog knows where you are.
-                m.player = self.player
-            count += 1
-            ms.append(m)
-        return ms
+    def build_monsters(self,world):
+        return [self.monster_part(body) for body in world.monsters]
+
+    def monster_part(self,body):
+        classname = body.__class__.__name__
+        M = getattr(monsters,classname,monsters.Monster)
+        m = self.monster_parts[body] = M(body.name,body=body)
+        return m
+
+    def add_monster(self,body):
+        """Show a monster that has joined the world"""
+        m = self.monster_part(body)
+        m.restyle(True)
+        self["monsters"].append(m)
+
+    def remove_monster(self,body):
+        """Stop showing a monster that has left the world"""
+        group = self["monsters"]
+        for m in list(group.contents):
+            if m.body is body:
+                group.remove(m)
+
+    def reload_level(self):
+        """Show the hexes and powerups now in the level, after
+        chunks of it have been loaded or unloaded"""
+        self.hexfield.build_dl()
+        self.hexfield.prepare()
+        self.show_powerups()
+
+    def show_powerups(self):
+        group = self["powerups"]
+        for p in list(group.contents):
+            group.remove(p)
+        for p in self.build_powerups(self.level):
+            p.restyle(True)
+            group.append(p)
 
     def build_powerups(self,level):
         ps = []
@@ -246,7 +294,6 @@ class GameScreen(Screen):
             pos = collision.h_centre(*coords)
             P = getattr(graphics,classname,graphics.Ball)
             p = P(repr(coords), geom=dict(pos=pos,angle=0))
-            p.duration = float('inf')
             ps.append(p)
         return ps
 
@@ -265,46 +312,46 @@ class GameScreen(Screen):
     def setup_style(self):
         lighting.setup()
 
-    def inc_score(self,points):
-        self.score += points
-        self["hud"].set_score(self.score)
-
-    def add_ball(self,direction,Kind=Ball):
-        ball = Kind(direction=direction)
-        r = ball.getgeom("radius")
-        player = self.player
-        pr = player.getgeom('radius',0.49)
-        ball.pos = ball.velocity.normalise() * (r + pr + 0.1) + player.pos
-        ball.restyle(True)
-        self["balls"].append(ball)
+    def warm_balls(self):
+        """Get balls of the kinds that will be fired ready to show"""
+        pool = self.ball_pool
+        pool.warm(graphics.Ball,self.warm_ball_count)
+        special = self.world.special_ball
+        if special:
+            B = getattr(graphics,special.__name__,graphics.Ball)
+            pool.warm(B,self.warm_ball_count)
+
+    def add_ball(self,body):
+        """Show a ball that has just been fired"""
+        B = getattr(graphics,body.__class__.__name__,graphics.Ball)
+        self["balls"].append(self.ball_pool.take(B,body))
+
+    def step_contents(self,ms):
+        """Give balls that have expired back to the pool, and step
+        everything else"""
+        balls = self["balls"]
+        for ball in [b for b in balls.contents if b.expired()]:
+            balls.remove(ball)
+            self.ball_pool.give_back(ball)
+        super(GameScreen,self).step_contents(ms)
              
     def click(self,x,y,button,mods):
         """ Click to fire """
-        if self.mode == "dying":
+        if self.world.mode != "playing":
             return
         if self.mode == "story":
             self.dismiss_story_page()
             return
-        if self.reload:
-            return
-        if button & 6:
-            if self.special_ammo <= 0:
-                return
-            self.special_ammo -= 1
-            self["hud"].set_ammo(self.special_ammo,
-                                 self.special_ball.__name__)
         if self.first_person:
             a = radians(self.player.angle)
             v = Vec(cos(a),sin(a))
         else:
             vx,vy,vw,vh = self.vport
             v = Vec(x - (vx + vw//2), y - (vy + vh//2))
-        kind = (self.special_ball if button & 6 else Ball)
-        self.add_ball(direction=v,Kind=kind)
-        self.reload = 300
+        self.fire_queue.append((v,bool(button & 6)))
 
     def keydown(self,sym,mods):
-        if self.mode == "dying":
+        if self.world.mode != "playing":
             return
         if self.mode == "story":
             self.dismiss_story_page()
@@ -318,12 +365,16 @@ class GameScreen(Screen):
                 self.camera.look_from_spherical(2,self.player.angle + 180,2,200)
                 self.first_person = True
         elif sym == pygletkey.ESCAPE:
-            self.player_die("boredom")
+            self.give_up = True
+        elif sym == pygletkey.F5 and self.world.stream is None:
+            self.quick_save = self.world.snapshot()
+            sounds.play("chamber")
+        elif sym == pygletkey.F9 and self.quick_save:
+            if not self.recorder: # a replay can't jump about
+                self.restore(self.quick_save)
         elif sym == pygletkey.RETURN:
             a = radians(self.player.angle)
-            v = Vec(cos(a),sin(a)) * 0.01 # per ms
-            self.add_ball(v)
-            self.reload = 300
+            self.launch_queue.append(Vec(cos(a),sin(a)))
 
     def keyup(self,sym,mods):
         try:
@@ -331,166 +382,231 @@ class GameScreen(Screen):
         except KeyError:
             pass # never mind
 
-    def step_player(self,ms):
-        ms = min(ms,35.0) # avoid collision glitches when fps is low
-        player = self.player
-        if self.keysdown:
-            if self.first_person:
-                a = self.player.angle
-                strafe = 0
-                if pygletkey.Q in self.keysdown:
-                    strafe = a+90
-                elif pygletkey.E in self.keysdown:
-                    strafe = a-90
-                if pygletkey.A in self.keysdown:
-                    a += 5
-                if pygletkey.D in self.keysdown:
-                    a -= 5
-                theta = radians(a)
-                if pygletkey.W in self.keysdown:
-                    v = Vec(cos(theta),sin(theta)) * ms * 0.01
-                elif pygletkey.S in self.keysdown:
-                    v = Vec(cos(theta),sin(theta)) * ms * -0.01
-                else:
-                    v = Vec(0,0)
-                if strafe:
-                    A = radians(strafe)
-                    v += Vec(cos(A),sin(A)) * ms * 0.01
-                dx,dy,dz = v
-                player.angle = a
-                self.camera.look_from_spherical(30,a + 180,20,200)
+    def read_inputs(self,ms):
+        """What the player wants to do this step"""
+        inputs = world.Inputs(fire=self.fire_queue,
+                              launch=self.launch_queue,
+                              give_up=self.give_up)
+        self.fire_queue = []
+        self.launch_queue = []
+        self.give_up = False
+        keys = self.keysdown
+        if not keys:
+            return inputs
+        if self.first_person:
+            a = self.world.player.angle
+            strafe = 0
+            if pygletkey.Q in keys:
+                strafe = a+90
+            elif pygletkey.E in keys:
+                strafe = a-90
+            if pygletkey.A in keys:
+                a += 0.3 * ms
+            if pygletkey.D in keys:
+                a -= 0.3 * ms
+            theta = radians(a)
+            if pygletkey.W in keys:
+                v = Vec(cos(theta),sin(theta))
+            elif pygletkey.S in keys:
+                v = Vec(cos(theta),sin(theta)) * -1
             else:
-                z = Vec(0,0)
-                v = sum((self.movekeys.get(k,z) for k in self.keysdown),z).normalise() * ms * 0.01
-                dx,dy,dz = v
-                if dx or dy:
-                    a = degrees(atan2(dy,dx))
-                    player.angle = a
-            if dx or dy:
-                # See if player will collide with any hexagons
-                px,py,pz = player.pos
-                obstacles = self.level.obstacles_near(px,py)
-                newpos = v + player.pos
-                r = player.getgeom('radius',0.49)
-                for hc,hr,cell in obstacles:
-                    P = collision.collides(hc,hr,player.pos,r,v,collision.COLLIDE_POSITION)
-                    if P:
-                        newpos = P
-                        break
-                player.pos = newpos
-                self.camera.look_at(tuple(player.pos))
-                # See if player has escaped
-                phex = collision.nearest_neighbours(newpos.x,newpos.y,0).next()
-                if phex == self.player_exit:
-                    sounds.play("fanfare")
-                    if self.levelnum > 0:
-                        levelnum = self.levelnum + 1
-                    else:
-                        levelnum = self.levelnum - 1
-                    level = self.find_level(levelnum)
-                    if level:
-                        self.exit_to(GameScreen,score=self.score,level=level,
-                                     levelnum=levelnum,ammo=self.special_ammo,
-                                     special=self.special_ball)
-                    else:
-                        self.exit_to(VictoryScreen,score=self.score)
-                elif phex in self.level.powerups:
-                    bname = self.hexfield.collect(*phex)
-                    if bname:
-                        B = getattr(graphics,bname)
-                        if B == self.special_ball:
-                            self.special_ammo += B.ammo
-                        else:
-                            self.special_ball = B
-                            self.special_ammo = B.ammo
-                        sounds.play("chamber")
-                        self["hud"].set_ammo(self.special_ammo, 
-                                             self.special_ball.__name__)
-                        b = self[repr(phex)]
-                        if b:
-                            self["powerups"].remove(b)
-
-    def step_balls(self,ms):
-        ms = min(ms,27.0) # avoid collision glitches when fps is low
-        player = self.player
-        dying = (self.mode == "dying")
-        pr = player.getgeom('radius',0.49)
-        ppos = player.pos
-        for ball in self["balls"].contents:
-            v = ball.velocity * ms
-            bx,by,bz = pos = ball.pos
-            newpos = v + pos
-            r = ball.getgeom('radius',0.2)
-            obstacles = self.level.obstacles_near(bx,by)
-            for hc,hr,cell in obstacles:
-                P = collision.collides(hc,hr,pos,r,v,collision.COLLIDE_REBOUND)
-                if P:
-                    newpos, bv_times_ms = P
-                    vel = bv_times_ms * (1/ms)
-                    if ball.maxdestroy > 0 and not dying:
-                        points = self.hexfield.destroy(hc,hr)
-                        if points:
-                            sounds.play(points[1])
-                            ball.maxdestroy -= 1
-                            ball.duration -= 1000
-                            self.inc_score(points[0])
-                            if not ball.bounces:
-                                vel = ball.velocity
-                            else:
-                                vel *= 0.95
-                    ball.velocity = vel
-                    break
-            ball.pos = newpos
-            if (ball.lethal
-                and not dying 
-                and (ball.pos - ppos).length() < (r + pr)):
-                self.player_die("{0} trauma".format(ball.__class__.__name__.lower()))
-
-    def step_monsters(self,ms):
-        ms = min(ms,27.0) # avoid collision glitches when fps is low
-        player = self.player
-        dying = (self.mode == "dying")
-        pr = player.getgeom('radius',0.49)
-        ppos = Vec(player.pos)
-        for mon in self["monsters"].contents:
-            v = mon.velocity * ms
-            mx,my,mz = pos = mon.pos
-            newpos = v + pos
-            r = mon.getgeom('radius',0.49)
-            obstacles = self.level.obstacles_near(mx,my)
-            collided = False
-            for hc,hr,cell in obstacles:
-                P = collision.collides(hc,hr,pos,r,v,collision.COLLIDE_REBOUND)
-                if P:
-                    newpos, mv_times_ms = P
-                    velocity = mv_times_ms * (1/ms)
-                    mon.on_collision(None,newpos,velocity)
-                    collided = True
-                    break
-            if not dying:
-                for ball in self["balls"].contents:
-                    br = ball.getgeom("radius")
-                    if (ball.pos - newpos).length() < (r + br):
-                        mon.on_collision(ball,newpos,mon.velocity)
-                        collided = True
-                        break
-            if mon._expired:
-                return
-            if not collided:
-                mon.pos = newpos
-            if not dying and (mon.pos - ppos).length() < (r + pr):
-                mon.on_collision(player,newpos,(ppos - mon.pos)*0.01)
-                self.player_die("{0} {1}".format(
-                        mon.harm_type,
-                        mon.__class__.__name__))
-
-    def player_die(self,dying_of=""):
-        sounds.play("pain")
-        self.set_mode("dying")
-        self.player.die()
-        self.dying_of = dying_of
-        self.dying_time = 3000
-        lighting.light_colour(self.light,(0,0,0,0),self.dying_time)
+                v = Vec(0,0)
+            if strafe:
+                A = radians(strafe)
+                v += Vec(cos(A),sin(A))
+            inputs.move = v
+            inputs.face = a
+        else:
+            z = Vec(0,0)
+            inputs.move = sum((self.movekeys.get(k,z) for k in keys),
+                              z).normalise()
+        return inputs
+
+    def show_events(self,events):
+        """Play sounds, update the HUD and the hexagon field
+        and change screens for the things that happened in the
+        world during the last step"""
+        world = self.world
+        changed = False
+        for event in events:
+            what = event[0]
+            if what == "sound":
+                sounds.play(event[1])
+            elif what == "ball":
+                self.add_ball(event[1])
+            elif what == "score":
+                self["hud"].set_score(event[1])
+            elif what == "ammo":
+                self["hud"].set_ammo(event[1],event[2])
+            elif what == "destroy":
+                self.hexfield.clear_cell(*event[1:])
+                changed = True
+            elif what == "collect":
+                self.hexfield.clear_cell(*event[1:])
+                changed = True
+                b = self[repr(event[1:])]
+                if b:
+                    self["powerups"].remove(b)
+            elif what == "die":
+                self.player.die()
+                lighting.light_colour(self.light,(0,0,0,0),
+                                      world.dying_time)
+            elif what == "dead":
+                self.exit_to(ScoreScreen,
+                             score=world.score,
+                             levelnum=self.levelnum,
+                             died_of=world.dying_of,
+                             game=self if self.level_start else None)
+            elif what == "exit":
+                self.exit_level()
+            elif what == "monster":
+                self.add_monster(event[1])
+            elif what == "freeze":
+                self.remove_monster(event[1])
+            elif what == "chunks":
+                self.reload_level()
+                changed = False
+        if changed:
+            self.hexfield.prepare()
+
+    def restore(self,snap):
+        """Put the world back as it was when snap was taken (see
+        World.snapshot()), and show it as it now is"""
+        changed = self.world.restore(snap)
+        self.show_world(changed)
+
+    def show_world(self,changed=()):
+        """Show the world as it now is, after it has been restored,
+        reusing the parts that are already built.  changed is the
+        hexes that have been put back."""
+        world = self.world
+        hf = self.hexfield
+        for hc,hr in changed:
+            hf.restore_cell(hc,hr)
+        hf.prepare()
+        self.fog_version = None
+        self.show_powerups()
+        group = self["monsters"]
+        for m in list(group.contents):
+            group.remove(m)
+        for body in world.monsters:
+            m = self.monster_parts.get(body)
+            if m is None:
+                m = self.monster_part(body)
+                m.restyle(True)
+            group.append(m)
+        balls = self["balls"]
+        for ball in list(balls.contents):
+            balls.remove(ball)
+            self.ball_pool.give_back(ball)
+        for body in world.balls:
+            self.add_ball(body)
+        self.player.revive()
+        hud = self["hud"]
+        hud.reset_score(world.score)
+        special = world.special_ball
+        hud.set_ammo(world.special_ammo,special and special.__name__)
+        lighting.light_colour(self.light,(1,1,1,1))
+        self.fire_queue = []
+        self.launch_queue = []
+        self.give_up = False
+        self.last_places = {}
+        self.drawn_places.clear()
+        self.sync_parts()
+        if main.options.fog:
+            self.show_visible()
+        self.camera.look_at(tuple(world.player.pos))
+
+    def retry(self):
+        """Start the level again, without loading it again or building
+        any more parts, as the score screen's Try Again.  Return
+        self, to be the next screen."""
+        world = self.world
+        changed = world.restore(self.level_start)
+        # a fresh start, as if the level had been picked from the title
+        world.score = 0
+        world.special_ammo = 0
+        world.special_ball = None
+        self.show_world(changed)
+        self.quick_save = None
+        self._expired = False
+        self.keysdown.clear()
+        if self.recorder:
+            self.recorder.start(world)
+        self.start_music()
+        sounds.play(self.level.sound)
+        return self
+
+    def show_visible(self):
+        """Only draw the hexagons, monsters and balls that the
+        player can see"""
+        sight = self.world.field_of_view()
+        if sight.version != self.fog_version:
+            self.fog_version = sight.version
+            self.hexfield.set_visible(sight.visible)
+        visible = sight.visible
+        pixel_to_hex = hexgrid.pixel_to_hex
+        for p in self.moving_parts():
+            if p is not self.player:
+                x,y = p.pos[:2]
+                p._visible = pixel_to_hex(x,y) in visible
+
+    def exit_level(self):
+        world = self.world
+        if self.levelnum > 0:
+            levelnum = self.levelnum + 1
+        else:
+            levelnum = self.levelnum - 1
+        level = self.find_level(levelnum)
+        if level:
+            self.exit_to(GameScreen,score=world.score,level=level,
+                         levelnum=levelnum,ammo=world.special_ammo,
+                         special=world.special_ball,seed=world.seed)
+        else:
+            self.exit_to(VictoryScreen,score=world.score)
+
+    def cleanup(self):
+        if main.options.time:
+            stats = self.ball_pool.stats()
+            print ("{0}: balls made {1}, reused {2}, given back {3},"
+                   " free {4}".format(self.level.name,stats["made"],
+                                      stats["reused"],stats["given back"],
+                                      stats["free"]))
+
+    def moving_parts(self):
+        parts = [self.player]
+        parts.extend(self["monsters"].contents)
+        parts.extend(self["balls"].contents)
+        return parts
+
+    def sync_parts(self):
+        """Move the parts to where their bodies are now"""
+        for p in self.moving_parts():
+            if p is self.player and self.world.mode == "dying":
+                continue # sinking into the floor
+            body = p.body
+            p.pos = body.pos
+            p.angle = body.angle
+
+    def begin_interpolation(self,alpha):
+        """Draw moving parts part way between their positions
+        before and after the last simulation step"""
+        if alpha >= 1.0:
+            return
+        drawn = self.drawn_places
+        for p,(pos0,a0) in self.last_places.items():
+            pos1,a1 = p.pos, p.angle
+            drawn[p] = pos1,a1
+            p.pos = tuple(x0 + (x1 - x0) * alpha
+                          for x0,x1 in zip(pos0,pos1))
+            turn = (a1 - a0 + 180) % 360 - 180
+            p.angle = a0 + turn * alpha
+
+    def end_interpolation(self):
+        for p,(pos,angle) in self.drawn_places.items():
+            p.pos = pos
+            p.angle = angle
+        self.drawn_places.clear()
 
     def step(self,ms):
         if ms == 0:
@@ -498,21 +614,27 @@ class GameScreen(Screen):
         lighting.step(ms)
         if self.mode == "story":
             return
-        if self.reload > 0:
-            self.reload = max(0,self.reload - ms)
-        self.step_monsters(ms)
-        self.step_balls(ms)
+        self.last_places = dict((p,(tuple(p.pos),p.angle))
+                                for p in self.moving_parts())
+        world = self.world
+        ppos = world.player.pos
+        inputs = self.read_inputs(ms)
+        if self.recorder:
+            self.recorder.record(ms,inputs)
+        world.step(ms,inputs)
+        if self.recorder and world.mode in ("dead","exited"):
+            self.recorder.finish(world)
+        self.sync_parts()
         self.step_contents(ms)
-        if self.mode == "dying":
-            if self.dying_time <= 0:
-                self.exit_to(ScoreScreen,
-                             score=self.score,
-                             levelnum=self.levelnum,
-                             died_of=self.dying_of)
-            else:
-                self.dying_time -= ms
-        else:
-            self.step_player(ms)
+        self.show_events(world.events)
+        if main.options.fog:
+            self.show_visible()
+        if world.mode == "playing":
+            if world.player.pos is not ppos:
+                self.camera.look_at(tuple(world.player.pos))
+            if self.first_person and self.keysdown:
+                self.camera.look_from_spherical(
+                    30,world.player.angle + 180,20,200)
 
 class TitleScreen(Screen):
     music = "title"
@@ -554,7 +676,6 @@ class TitleScreen(Screen):
             pos = collision.h_centre(*coords)
             M = getattr(graphics,classname,graphics.Ball)
             m = M(classname, geom=dict(pos=pos,angle=0))
-            m.duration = float('inf')
             sv.append(m)
         sv.camera.look_at(pos,10)
         sv.camera.look_from_spherical(45,270,70)
@@ -640,10 +761,11 @@ class ScoreScreen(Screen):
             "font":"Courier",
             "font_size":20 },
         }
-    def __init__(self,score,died_of="",levelnum=None,**kw):
+    def __init__(self,score,died_of="",levelnum=None,game=None,**kw):
         self.score = score
         self.died_of = died_of
         self.levelnum = levelnum
+        self.game = game # the GameScreen to retry, if it can be
         super(ScoreScreen,self).__init__(**kw)
         
     def build_parts(self,**kw):
@@ -690,7 +812,10 @@ class ScoreScreen(Screen):
         if name == "ok":
             self.exit_to(TitleScreen)
         elif name == "retry":
-            self.exit_to(GameScreen,levelnum=self.levelnum)
+            if self.game:
+                self.exit_to(self.game.retry)
+            else:
+                self.exit_to(GameScreen,levelnum=self.levelnum)
 
 # Initialisation
 Screen.set_next(TitleScreen)
@@ -0,0 +1,51 @@
+"""
+ Spatial hash over the hexagon grid
+
+ Moving things (balls, monsters, the player) are put in a bucket
+ for the hexagon containing their centre, so that overlap tests
+ only need to look at the things in nearby buckets instead of
+ every thing in the level.
+
+ Two points less than one unit apart (the side of a hexagon) are
+ always in the same or adjacent hexagons, and each further ring
+ of hexagons adds at least another unit, so a search out to
+ distance d only needs int(d) + 1 rings of buckets.
+"""
+import hexgrid
+
+class SpatialHash(object):
+    """Buckets of things, keyed by hexagon (col,row)"""
+    def __init__(self):
+        self.buckets = {} # {(col,row):[(order,thing)]}
+        self.count = 0
+
+    def clear(self):
+        self.buckets = {}
+        self.count = 0
+
+    def insert(self,thing,x,y):
+        """Put thing in the bucket for x,y.  Things are returned by
+        near() in the order they were inserted."""
+        key = hexgrid.pixel_to_hex(x,y)
+        self.buckets.setdefault(key,[]).append((self.count,thing))
+        self.count += 1
+
+    def build(self,parts):
+        """Clear, then insert each part at its pos"""
+        self.clear()
+        for p in parts:
+            x,y,z = p.pos
+            self.insert(p,x,y)
+
+    def near(self,x,y,reach=1.0):
+        """List of things that may lie within reach of x,y,
+        in insertion order"""
+        col,row = hexgrid.pixel_to_hex(x,y)
+        get = self.buckets.get
+        found = []
+        for key in hexgrid.spiral(col,row,int(reach) + 1):
+            bucket = get(key)
+            if bucket:
+                found.extend(bucket)
+        found.sort()
+        return [thing for order,thing in found]
@@ -0,0 +1,145 @@
+"""
+ Streaming a chunked level around the player
+
+ A level saved with levelfile.Level.save_chunks() can be played
+ without ever loading all of it.  A LevelStream keeps only the
+ chunks near the player in the World's Level:
+
+   active  chunks within radius of the player's chunk: their
+           monsters are in World.monsters and move as usual
+   loaded  chunks within radius + 1: their hexes are in the Level,
+           so the active monsters always have their walls
+   frozen  monsters that have wandered out of the active chunks,
+           or whose chunk the player has left, are taken out of
+           the World, and put back just as they were when their
+           chunk is active again
+
+ Chunks further than radius + 2 from the player are unloaded.  Any
+ hexes destroyed and powerups collected in them are remembered, so
+ they are the same when the chunk is loaded again.  Monsters are
+ made from a chunk's monster codes the first time it is active.
+
+ So the time to start a level, and the work and memory of each
+ step, depend on the radius, not on the size of the level.
+
+ The World tells the view about the changes with events:
+
+   ("monster", mon)   a monster has joined the World
+   ("freeze", mon)    a monster has left the World
+   ("chunks",)        hexes and powerups have been loaded or unloaded
+"""
+import hexgrid
+import levelfile
+
+
+class LevelStream(object):
+    radius = 1 # chunks around the player's chunk that are active
+
+    def __init__(self,chunks,radius=None):
+        self.chunks = chunks
+        self.size = chunks.size
+        if radius is not None:
+            self.radius = radius
+        self.centre = None
+        self.loaded = set()  # chunks whose hexes are in the Level
+        self.active = set()  # chunks whose monsters are in the World
+        self.seen = set()    # chunks that have ever been loaded
+        self.pending = {}    # {chunk:monster codes} not yet made
+        self.frozen = {}     # {chunk:[monster]}
+        self.changes = {}    # {chunk:(hexes,powerups)} of unloaded chunks
+        self.loads = 0
+        self.unloads = 0
+
+    def chunk_at(self,x,y):
+        hc,hr = hexgrid.pixel_to_hex(x,y)
+        return levelfile.chunk_of(hc,hr,self.size)
+
+    def around(self,key,r):
+        kx,ky = key
+        return set((kx + dx,ky + dy)
+                   for dx in range(-r,r + 1) for dy in range(-r,r + 1))
+
+    def update(self,world):
+        """Load, unload, wake and freeze chunks for where the
+        player is now"""
+        x,y,z = world.player.pos
+        centre = self.chunk_at(x,y)
+        if centre != self.centre:
+            self.centre = centre
+            self.move_to(world,centre)
+        self.freeze_strays(world)
+
+    def move_to(self,world,centre):
+        r = self.radius
+        active = self.around(centre,r)
+        wanted = self.around(centre,r + 1)
+        keep = self.around(centre,r + 2)
+        level = world.level
+        gone = [k for k in self.loaded if k not in keep]
+        new = [k for k in wanted if k not in self.loaded]
+        for k in gone:
+            self.unload(level,k)
+        for k in new:
+            self.load(level,k)
+        if gone or new:
+            level.build_grid()
+            world.level_changed()
+        for k in sorted(active - self.active):
+            self.wake(world,k)
+        self.active = active
+
+    def load(self,level,key):
+        chunk = self.chunks.read(key)
+        hexes,powerups = chunk["hexes"],chunk["powerups"]
+        if key in self.changes:
+            changed,powerups = self.changes.pop(key)
+            hexes.update(changed)
+        if key not in self.seen:
+            self.seen.add(key)
+            self.pending[key] = chunk["monsters"]
+        level.add_cells(hexes,powerups)
+        self.loaded.add(key)
+        self.loads += 1
+
+    def unload(self,level,key):
+        """Take a chunk's hexes out of the level, remembering how
+        they differ from the chunk in the file"""
+        size = self.size
+        cells = [coords for coords in level.hexes
+                 if levelfile.chunk_of(coords[0],coords[1],size) == key]
+        original = self.chunks.read(key)
+        changed = dict((coords,level.hexes[coords]) for coords in cells
+                       if original["hexes"].get(coords)
+                       != level.hexes[coords])
+        powerups = dict((coords,level.powerups[coords]) for coords in cells
+                        if coords in level.powerups)
+        if changed or powerups != original["powerups"]:
+            self.changes[key] = changed,powerups
+        level.remove_cells(cells)
+        self.loaded.discard(key)
+        self.unloads += 1
+
+    def wake(self,world,key):
+        """Put the monsters of a chunk into the World"""
+        codes = self.pending.pop(key,None)
+        if codes:
+            for coords,classname in sorted(codes.items()):
+                world.add_monster(world.build_monster(coords,classname))
+        for mon in self.frozen.pop(key,()):
+            world.add_monster(mon)
+
+    def freeze_strays(self,world):
+        """Take monsters outside the active chunks out of the World"""
+        active = self.active
+        chunk_at = self.chunk_at
+        for mon in list(world.monsters):
+            x,y,z = mon.pos
+            key = chunk_at(x,y)
+            if key not in active and not mon.expired:
+                world.remove_monster(mon)
+                self.frozen.setdefault(key,[]).append(mon)
+        loaded = self.loaded
+        for ball in world.balls:
+            x,y,z = ball.pos
+            if chunk_at(x,y) not in loaded:
+                ball.expired = True # flown off the edge of the world
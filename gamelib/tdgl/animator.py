@@ -7,7 +7,6 @@
     (see www.gnu.org for details)
 """
 from __future__ import division
-from copy import deepcopy
 
 def interpolator(xfrom,xto,ms):
     """Interpolate between two values, which should be both a number,
@@ -50,6 +49,11 @@ class Interpolator(object):
         return self.nowms >= self.endms
     def at_start(self):
         return self.nowms == 0
+    def copy(self):
+        other = object.__new__(self.__class__)
+        for name in self.__slots__:
+            setattr(other,name,getattr(self,name))
+        return other
 
 class TupleInterpolator(Interpolator):
     """An object that interpolates between one tuple of values to another
@@ -95,6 +99,10 @@ class DictInterpolator(Interpolator):
                 self.current[k] = v0*blend0 + vto[k]*blend1
         else:
             self.current = self.vfrom.copy()
+    def copy(self):
+        other = Interpolator.copy(self)
+        other.current = self.current.copy() # blend() changes it in place
+        return other
 
 class Oscillator(object):
     """Go from one value to another and back indefinitely.
@@ -119,6 +127,12 @@ class Oscillator(object):
         return False
     def at_start(self):
         return False
+    def copy(self):
+        other = object.__new__(self.__class__)
+        other.forwards = self.forwards.copy()
+        other.backwards = self.backwards.copy()
+        other.current = self.current
+        return other
 
 class Sequencer(object):
     """ interpolate between a series of values """
@@ -153,6 +167,12 @@ class Sequencer(object):
     def at_start(self):
         return self.interp.at_start() and self.index == 0
 
+    def copy(self):
+        other = object.__new__(self.__class__)
+        other.__dict__.update(self.__dict__)
+        other.interp = self.interp.copy()
+        return other
+
     
 class Animator(object):
     """A collection of numeric values which may be static or changing"""
@@ -201,8 +221,15 @@ class Animator(object):
         except KeyError:
             pass
     def copy(self):
-        """Return a copy of the Animator's current state."""
-        return deepcopy(self)
+        """Return a copy of the Animator's current state.
+        The values and interpolators are copied, but not the
+        lists of values they go through, which never change."""
+        other = object.__new__(self.__class__)
+        other.current = dict((k,(x.copy() if isinstance(x,dict) else x))
+                             for k,x in self.current.items())
+        other.interpolators = dict((k,it.copy()) for k,it
+                                   in self.interpolators.items())
+        return other
 
     def update(self,other):
         """Update by setting current values from another dict-like object."""
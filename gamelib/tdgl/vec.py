@@ -1,22 +1,24 @@
 # vector normals module
 """Utilities for calculating face normals on a triangle mesh, plus Vec class
-for simple 3D vectors.
+for simple 3D vectors, and Vec2 for vectors in the XY plane.
 
-Works better if you have psyco
+Vec arithmetic makes new Vecs without going through Vec(), whose
+checks the numbers have already passed, and Vecs can be changed in
+place with +=, -= and *=.  The functions at the end work on many
+vectors at once as numpy arrays, if numpy is installed.
 
 This file copyright Peter Harris Sep 2007, released under the terms of the
 GNU GPL v3 or later. See www.gnu.org for details.
 
 """
 
+using_psyco = False
+
 try:
-    import psyco
-    from psyco import compact as __baseclass
-    using_psyco = True
+    import numpy
 except ImportError:
-    using_psyco = False
-    __baseclass = object
-    
+    numpy = None
+
 from math import sqrt
 
 def normalise(x,y,z):
@@ -39,123 +41,307 @@ def away_from(vertex,centre):
     for i in 0,1,2:
         v[i] = vertex[i] - centre[i]
     return normalise(v[0],v[1],v[2])
-    
-class Vec(__baseclass):
+
+_new = object.__new__
+
+def _vec(x,y,z):
+    """A new Vec of floats x,y,z, without the checks in Vec()"""
+    v = _new(Vec)
+    v.x = x
+    v.y = y
+    v.z = z
+    return v
+
+def _vec2(x,y):
+    """A new Vec2 of floats x,y"""
+    v = _new(Vec2)
+    v.x = x
+    v.y = y
+    v.z = 0.0
+    return v
+
+class Vec(object):
     """3d vector"""
-    if not using_psyco:
-        __slots__ = ('x','y','z')
+    __slots__ = ('x','y','z')
 
     def __init__(self,x,y=None,z=0.0):
-        if y is None:
-            if type(x) is tuple:
-                self.x = float(x[0])
-                self.y = float(x[1])
-                if len(x) == 3:
-                    self.z = float(x[2])
-                else:
-                    self.z = 0.0
-            else:
-                try:
-                    self.x = x.x
-                    self.y = x.y
-                    self.z = x.z
-                except AttributeError:
-                    try:
-                        self.x = x.i
-                        self.y = x.j
-                        self.z = x.k
-                    except:
-                        raise ValueError("Can't make a Vec from a %s" % type(x))
-        else:
+        if y is not None:
             self.x = float(x)
             self.y = float(y)
             self.z = float(z)
-        
+        elif type(x) is tuple:
+            self.x = float(x[0])
+            self.y = float(x[1])
+            if len(x) == 3:
+                self.z = float(x[2])
+            else:
+                self.z = 0.0
+        else:
+            try:
+                self.x = x.x
+                self.y = x.y
+                self.z = x.z
+            except AttributeError:
+                try:
+                    self.x = x.i
+                    self.y = x.j
+                    self.z = x.k
+                except:
+                    raise ValueError("Can't make a Vec from a %s" % type(x))
+
     def dot(self,other):
         """ inner product """
-        if type(other) is not Vec:
+        if not isinstance(other,Vec):
             other = Vec(other)
         return self.x * other.x + self.y * other.y + self.z * other.z
-    
+
     def length(self):
         """ length of vector """
         return sqrt(self.x ** 2 + self.y ** 2 + self.z ** 2)
-    
+
     def __mul__(self, k):
         """ multiply by scalar """
-        return Vec(self.x * k, self.y * k, self.z * k)
+        k = float(k)
+        return _vec(self.x * k, self.y * k, self.z * k)
     __rmul__ = __mul__
-        
+
     def __add__(self, other):
         """ vector addition """
-        if type(other) is not Vec:
+        if not isinstance(other,Vec):
             other = Vec(other)
-        return Vec(self.x + other.x, self.y + other.y, self.z + other.z)
+        return _vec(self.x + other.x, self.y + other.y, self.z + other.z)
     __radd__ = __add__
-        
+
     def __sub__(self, other):
         """ vector subtraction """
-        if type(other) is not Vec:
+        if not isinstance(other,Vec):
             other = Vec(other)
-        return Vec(self.x - other.x, self.y - other.y, self.z - other.z)
+        return _vec(self.x - other.x, self.y - other.y, self.z - other.z)
     __rsub__ = __sub__
 
+    def __iadd__(self, other):
+        """ add to this vector in place """
+        if type(other) is not Vec and not isinstance(other,Vec):
+            other = Vec(other)
+        self.x += other.x
+        self.y += other.y
+        self.z += other.z
+        return self
+
+    def __isub__(self, other):
+        """ subtract from this vector in place """
+        if type(other) is not Vec and not isinstance(other,Vec):
+            other = Vec(other)
+        self.x -= other.x
+        self.y -= other.y
+        self.z -= other.z
+        return self
+
+    def __imul__(self, k):
+        """ scale this vector in place """
+        k = float(k)
+        self.x *= k
+        self.y *= k
+        self.z *= k
+        return self
+
     def __div__(self,k):
         """ multiply by reciprocal of scalar """
         d = 1.0/k
         return self * d
     __rdiv__ = __div__
-        
+
     def __neg__(self):
         """ Reverse direction of vector """
-        return Vec(-self.x, -self.y, -self.z)
+        return _vec(-self.x, -self.y, -self.z)
 
     def __nonzero__(self):
         return self.x != 0.0 or self.y != 0.0 or self.z != 0.0
-        
+
     def projXY(self):
         """project onto XY"""
-        return Vec(self.x, self.y)
-        
+        return _vec(self.x, self.y, 0.0)
+
     def orthoXY(self):
         """orthogonal to projection onto XY"""
-        return Vec(-self.y, self.x)
-        
+        return _vec(-self.y, self.x, 0.0)
+
     def proj(self,other):
         """Projection of self onto another vector"""
-        if type(other) is not Vec:
+        if not isinstance(other,Vec):
             other = Vec(other)
         if not other:
-            return Vec(0.0,0.0,0.0)
+            return _vec(0.0,0.0,0.0)
         else:
             return other * (self.dot(other) / other.dot(other))
-    
+
     def normalise(self):
         d = self.length()
         if d == 0.0:
-            return Vec(0.0,0.0,0.0)
-        return Vec(self.x / d, self.y / d, self.z / d)
+            return _vec(0.0,0.0,0.0)
+        return _vec(self.x / d, self.y / d, self.z / d)
 
     def __repr__(self):
         return "Vec(%f,%f,%f)" % (self.x,self.y,self.z)
-        
+
     def __str__(self):
         return "Vec(%s,%s,%s)" % (str(self.x),str(self.y),str(self.z))
-        
+
     def cross(self,other):
         """cross product"""
-        if type(other) is not Vec:
+        if not isinstance(other,Vec):
             other = Vec(other)
-        return Vec(self.y * other.z - self.z * other.y,
-                   self.z * other.x - self.x * other.z,
-                   self.x * other.y - self.y * other.x)
+        return _vec(self.y * other.z - self.z * other.y,
+                    self.z * other.x - self.x * other.z,
+                    self.x * other.y - self.y * other.x)
     def __iter__(self):
         yield self.x
         yield self.y
         yield self.z
 
-if using_psyco:
-    psyco.bind(Vec)
-    psyco.bind(normalise)
-    psyco.bind(plane_normal)
-    psyco.bind(away_from)
+
+def _in_plane(other):
+    """other as a Vec, which must be in the XY plane to be added
+    to or taken from a Vec2 in place"""
+    if not isinstance(other,Vec):
+        other = Vec(other)
+    if other.z != 0.0:
+        raise ValueError("Can't change a Vec2 in place by %r" % (other,))
+    return other
+
+
+class Vec2(Vec):
+    """2d vector in the XY plane, whose z is always 0.0.
+
+    Sums, differences and multiples of Vec2s are Vec2s, worked out
+    without the z; mixed with a Vec, a Vec2 acts as a Vec.  But +=
+    and -= always change the Vec2 itself, as they do a Vec, so a Vec
+    added to or taken from it in place must have a z of 0."""
+    __slots__ = ()
+
+    def __init__(self,x,y=None):
+        if y is None:
+            if type(x) is tuple:
+                x,y = x[0],x[1]
+            else:
+                x,y = x.x,x.y
+        self.x = float(x)
+        self.y = float(y)
+        self.z = 0.0
+
+    def dot(self,other):
+        if type(other) is Vec2:
+            return self.x * other.x + self.y * other.y
+        return Vec.dot(self,other)
+
+    def length(self):
+        return sqrt(self.x ** 2 + self.y ** 2)
+
+    def __mul__(self, k):
+        k = float(k)
+        return _vec2(self.x * k, self.y * k)
+    __rmul__ = __mul__
+
+    def __add__(self, other):
+        if type(other) is Vec2:
+            return _vec2(self.x + other.x, self.y + other.y)
+        return Vec.__add__(self,other)
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if type(other) is Vec2:
+            return _vec2(self.x - other.x, self.y - other.y)
+        return Vec.__sub__(self,other)
+    __rsub__ = __sub__
+
+    def __iadd__(self, other):
+        if type(other) is not Vec2:
+            other = _in_plane(other)
+        self.x += other.x
+        self.y += other.y
+        return self
+
+    def __isub__(self, other):
+        if type(other) is not Vec2:
+            other = _in_plane(other)
+        self.x -= other.x
+        self.y -= other.y
+        return self
+
+    def __imul__(self, k):
+        k = float(k)
+        self.x *= k
+        self.y *= k
+        return self
+
+    def __neg__(self):
+        return _vec2(-self.x, -self.y)
+
+    def __nonzero__(self):
+        return self.x != 0.0 or self.y != 0.0
+
+    def orthoXY(self):
+        return _vec2(-self.y, self.x)
+
+    def normalise(self):
+        d = self.length()
+        if d == 0.0:
+            return _vec2(0.0,0.0)
+        return _vec2(self.x / d, self.y / d)
+
+    def __repr__(self):
+        return "Vec2(%f,%f)" % (self.x,self.y)
+
+    def __str__(self):
+        return "Vec2(%s,%s)" % (str(self.x),str(self.y))
+
+
+class VecPool(object):
+    """A free list of Vecs, for code that makes and throws away
+    lots of them.  Only give back Vecs that nothing else refers to."""
+    def __init__(self,size=0):
+        self.free = [_vec(0.0,0.0,0.0) for i in range(size)]
+
+    def get(self,x,y,z=0.0):
+        """A Vec of x,y,z, reused if one is free"""
+        free = self.free
+        if not free:
+            return _vec(float(x),float(y),float(z))
+        v = free.pop()
+        v.x = float(x)
+        v.y = float(y)
+        v.z = float(z)
+        return v
+
+    def give_back(self,*vecs):
+        self.free.extend(vecs)
+
+
+# Many vectors at once, as rows of a numpy array
+
+def as_array(vecs):
+    """n x 3 array of the x,y,z of a sequence of Vecs"""
+    return numpy.array([(v.x,v.y,v.z) for v in vecs],float).reshape(-1,3)
+
+def from_array(a):
+    """List of Vecs from the rows of an n x 3 array"""
+    return [_vec(x,y,z) for x,y,z in a.tolist()]
+
+def lengths(a):
+    """Lengths of the rows of an n x 3 array"""
+    return numpy.sqrt((a ** 2).sum(axis=1))
+
+def normalised(a):
+    """Rows of an n x 3 array scaled to length 1, leaving rows of
+    zeros as they are"""
+    d = lengths(a)
+    d[d == 0.0] = 1.0
+    return a / d[:,None]
+
+def dots(a,b):
+    """Inner products of the rows of two n x 3 arrays"""
+    return (a * b).sum(axis=1)
+
+def crosses(a,b):
+    """Cross products of the rows of two n x 3 arrays"""
+    return numpy.cross(a,b)
@@ -0,0 +1,718 @@
+"""
+  The World: everything that happens in a level, without any
+  of the drawing.
+
+  A World is built from a levelfile.Level, and owns the player,
+  monster and ball bodies (see bodies.py).  Each call to
+  step(ms,inputs) moves them, sorts out the collisions, scores
+  points, collects powerups and decides whether the player has
+  died or escaped.
+
+  On levels with lots of monsters, the numbers of all the bodies are
+  kept together in an entities.EntityStore, so that the monsters that
+  aren't near anything can be moved all at once (see quiet_monsters).
+
+  With lod=True, monsters far from the player get less attention,
+  so that the cost of a step depends on what is near the player
+  rather than on how many monsters the level has (see set_tiers).
+
+  With stream=streaming.LevelStream(...), the level is a chunked one
+  of which only the part around the player is loaded, and only the
+  monsters near the player are in the World (see streaming.py).
+
+  snapshot() takes a Snapshot of everything that changes as the
+  level is played, and restore() puts the World back as it was, so
+  that a level can be tried again, or played on from a checkpoint,
+  without loading it and building everything again.
+
+  paths is a pathindex.PathIndex of the level, for finding the way
+  across levels too big for the flow field.  It is built with the
+  World, so that the first query doesn't stall a step, and repaired
+  as hexagons are destroyed or put back.  Streamed levels, whose
+  hexes come and go, don't have one.
+
+  field_of_view() says which hexagons the player can see, working it
+  out again only when the player moves to another hexagon or one near
+  enough to matter is destroyed (see fov.py).
+
+  Nothing in here needs a window, an OpenGL context or pyglet
+  key codes, so a World can be run as fast as the CPU allows to
+  test or profile the game rules.  screen.GameScreen is a view
+  of a World: it turns key presses and mouse clicks into Inputs,
+  and draws the bodies.
+
+  Things the view may want to know about are put in the events
+  list during a step, which is emptied at the start of the next
+  step.  Events are tuples:
+
+    ("sound", name)           play a sound effect
+    ("ball", ball)            a new ball has been fired
+    ("destroy", hc, hr)       the hexagon at hc,hr was destroyed
+    ("collect", hc, hr)       the powerup at hc,hr was collected
+    ("score", score)          the score has changed
+    ("ammo", ammo, name)      the special ammo has changed
+    ("die", cause)            the player has died
+    ("dead",)                 the player has finished dying
+    ("exit",)                 the player has escaped the level
+    ("monster", mon)          a monster has joined the world
+    ("freeze", mon)           a monster has left the world
+    ("chunks",)               hexes and powerups have been loaded
+                              or unloaded
+"""
+from math import atan2, degrees
+import random
+from tdgl.vec import Vec
+
+import bodies
+import collision
+import entities
+import flowfield
+import fov
+import hexgrid
+import kinetic
+import pathindex
+import spatial
+
+
+class Inputs(object):
+    """What the player wants to do in one step.
+
+    move   : direction to walk in, length 1 for full speed
+    face   : angle to face (degrees), or None to face along move
+    fire   : list of (direction,special) for balls to fire
+    launch : list of directions for balls to fire regardless
+             of the reload time
+    give_up: True to die of boredom
+    """
+    def __init__(self,move=None,face=None,fire=(),launch=(),give_up=False):
+        self.move = move if move is not None else Vec(0,0)
+        self.face = face
+        self.fire = list(fire)
+        self.launch = list(launch)
+        self.give_up = give_up
+
+def level_seed(seed,levelnum):
+    """Seed for the random stream of one level of a game, so that
+    each level plays the same way for the same game seed however
+    it was reached"""
+    return seed * 1000 + levelnum
+
+class Snapshot(object):
+    """Everything about a World that changes as it is played: the
+    hexes and powerups, the bodies and what state they are in, the
+    score and ammo, and where the random stream has got to.  Taken
+    by World.snapshot() and put back by World.restore()"""
+    values = ("score","special_ammo","special_ball","ticks","time",
+              "mode","dying_of","dying_time","reload","monster_count")
+
+    def __init__(self,world):
+        level = world.level
+        self.hexes = dict(level.hexes)
+        self.powerups = dict(level.powerups)
+        self.player = world.player.get_state()
+        self.monsters = [(mon,mon.get_state()) for mon in world.monsters]
+        self.balls = [(ball,ball.get_state()) for ball in world.balls]
+        self.state = dict((name,getattr(world,name))
+                          for name in self.values)
+        self.random = world.random.getstate()
+
+class World(object):
+    dying_time = 3000
+    reload_time = 300
+    lod_near = 12.0     # monsters this close to the player move every step
+    lod_horizon = 3000  # ms; monsters further off than this are DORMANT
+    lod_skip = 4        # REDUCED monsters move every lod_skip steps
+    predict_walls = True # only test monsters near walls (see kinetic.py)
+    store_monsters = 32  # keep the bodies' numbers in an EntityStore on
+                         # levels with at least this many monsters
+
+    def __init__(self,level,levelnum=1,score=0,ammo=0,special=None,
+                 swept=False,seed=None,lod=False,stream=None):
+        if seed is None:
+            seed = random.getrandbits(32)
+        self.seed = seed
+        self.random = random.Random(level_seed(seed,levelnum))
+        self.level = level
+        self.levelnum = levelnum
+        self.score = score
+        self.special_ammo = ammo
+        self.special_ball = special
+        self.swept = swept
+        self.lod = lod
+        self.ticks = 0
+        self.time = 0 # ms the monsters have been moving
+        self.mode = "playing"
+        self.dying_of = ""
+        self.reload = 0
+        self.events = []
+        self.nearby_balls = spatial.SpatialHash()
+        self.flow = flowfield.FlowField(level)
+        if stream:
+            self.paths = None
+        else:
+            self.paths = pathindex.PathIndex(level)
+        self.sight = None
+        self.walls = kinetic.WallSchedule(level)
+        if (entities.numpy is not None
+            and len(level.monsters) >= self.store_monsters):
+            self.store = entities.EntityStore()
+        else:
+            self.store = None
+        self.player_exit = level.exit
+        self.player = bodies.Player(
+            "player",pos=collision.h_centre(*level.start))
+        self.player.world = self
+        self.monster_count = 0
+        self.monsters = self.build_monsters(level)
+        self.balls = []
+        if self.store:
+            for b in [self.player] + self.monsters:
+                self.store.add(b)
+        self.stream = stream
+        if stream:
+            stream.update(self)
+
+    def snapshot(self):
+        """A Snapshot of the world as it is now, for restore() to put
+        it back that way, e.g. to try a level again without loading
+        it again.  Not for streamed levels, whose monsters and hexes
+        come and go."""
+        if self.stream:
+            raise ValueError("Can't take a snapshot of a streamed level")
+        return Snapshot(self)
+
+    def restore(self,snap):
+        """Put the world back as it was when snap was taken.
+        Return [(col,row)] of the hexes that have changed back."""
+        store = self.store
+        if store:
+            for b in [self.player] + self.monsters + self.balls:
+                store.remove(b)
+        self.player.set_state(snap.player)
+        for b,state in snap.monsters + snap.balls:
+            b.set_state(state)
+        self.monsters = [mon for mon,state in snap.monsters]
+        self.balls = [ball for ball,state in snap.balls]
+        if store:
+            for b in [self.player] + self.monsters + self.balls:
+                store.add(b)
+        for name,value in snap.state.items():
+            setattr(self,name,value)
+        self.random.setstate(snap.random)
+        level = self.level
+        changed = []
+        for coords,cellcode in snap.hexes.items():
+            if level.hexes.get(coords) != cellcode:
+                level[coords] = cellcode
+                changed.append(coords)
+        level.powerups = dict(snap.powerups)
+        for hc,hr in changed:
+            self.flow.cell_changed(hc,hr)
+            self.paths.cell_changed(hc,hr)
+        if self.sight:
+            self.sight.forget()
+        self.walls.clear()
+        self.events = []
+        return changed
+
+    def build_monsters(self,level):
+        return [self.build_monster(coords,classname)
+                for coords, classname in sorted(level.monsters.items())]
+
+    def build_monster(self,coords,classname):
+        pos = collision.h_centre(*coords)
+        M = getattr(bodies,classname,bodies.Monster)
+        if classname == "Hunter" or coords == self.level.exit:
+            vel = Vec(0,0)
+        else: # random direction and speed
+            vel = (self.random.choice(collision.H_NORMAL) *
+                   self.random.gauss(M.speed,0.02) * 0.01)
+        m = M("{0}{1}".format(classname,self.monster_count),
+              pos=pos,velocity=vel)
+        m.world = self
+        if classname == "Balrog":
+            # The Balrog knows where you are.
+            m.player = self.player
+        self.monster_count += 1
+        return m
+
+    def add_monster(self,mon):
+        """Put a monster into the world, during or between steps"""
+        self.monsters.append(mon)
+        if self.store:
+            self.store.add(mon)
+        self.event("monster",mon)
+
+    def remove_monster(self,mon):
+        """Take a monster out of the world, as it is, so that it
+        can be put back later"""
+        self.monsters.remove(mon)
+        self.walls.forget(mon)
+        if self.store:
+            self.store.remove(mon)
+        self.event("freeze",mon)
+
+    def level_changed(self):
+        """Hexes have been put into or taken out of the level
+        (see streaming.py)"""
+        for mon in self.monsters:
+            self.walls.forget(mon) # due for a wall test
+        if self.sight:
+            self.sight.forget()
+        self.event("chunks")
+
+    def field_of_view(self):
+        """The fov.FieldOfView of what the player can see from
+        where they are now, built when first wanted"""
+        if self.sight is None:
+            self.sight = fov.FieldOfView(self.level)
+        x,y,z = self.player.pos
+        self.sight.look_from(*hexgrid.pixel_to_hex(x,y))
+        return self.sight
+
+    def can_see_player(self,mon):
+        """Whether the player and the monster can see each other"""
+        x,y,z = mon.pos
+        return self.field_of_view().can_see(*hexgrid.pixel_to_hex(x,y))
+
+    def event(self,*args):
+        self.events.append(args)
+
+    def sound(self,name):
+        self.event("sound",name)
+
+    def inc_score(self,points):
+        self.score += points
+        self.event("score",self.score)
+
+    def add_ball(self,direction,Kind=bodies.Ball):
+        player = self.player
+        ball = Kind(direction=direction)
+        ball.world = self
+        ball.pos = (ball.velocity.normalise() *
+                    (ball.radius + player.radius + 0.1) + player.pos)
+        if self.store:
+            self.store.add(ball)
+        self.balls.append(ball)
+        self.event("ball",ball)
+        return ball
+
+    def fire(self,direction,special=False):
+        """Fire a ball, or a special ball if there is any ammo left.
+        Return the ball, or None if it can't be fired yet"""
+        if self.reload:
+            return None
+        if special:
+            if self.special_ammo <= 0:
+                return None
+            self.special_ammo -= 1
+            self.event("ammo",self.special_ammo,
+                       self.special_ball.__name__)
+            Kind = self.special_ball
+        else:
+            Kind = bodies.Ball
+        ball = self.add_ball(direction,Kind)
+        self.reload = self.reload_time
+        return ball
+
+    def step_player(self,ms,inputs):
+        if not self.swept:
+            ms = min(ms,35.0) # avoid collision glitches when fps is low
+        player = self.player
+        if inputs.face is not None:
+            player.angle = inputs.face
+        v = inputs.move * (ms * 0.01)
+        dx,dy,dz = v
+        if not (dx or dy):
+            return
+        if inputs.face is None:
+            player.angle = degrees(atan2(dy,dx))
+        # See if player will collide with any hexagons
+        px,py,pz = player.pos
+        newpos = v + player.pos
+        r = player.radius
+        if self.swept:
+            obstacles = self.level.obstacles_near(
+                px,py,collision.sweep_reach(v,r))
+            newpos,_,_ = collision.sweep(obstacles,player.pos,r,v,
+                                         slide=True)
+        else:
+            obstacles = self.level.obstacles_near(px,py)
+            k,P = collision.collides_first(
+                obstacles,player.pos,r,v,collision.COLLIDE_POSITION)
+            if P:
+                newpos = P
+        player.pos = newpos
+        # See if player has escaped
+        phex = hexgrid.pixel_to_hex(newpos.x,newpos.y)
+        if phex == self.player_exit:
+            self.sound("fanfare")
+            self.mode = "exited"
+            self.event("exit")
+        elif phex in self.level.powerups:
+            self.collect(*phex)
+
+    def collect(self,hc,hr):
+        """Pick up the powerup at hc,hr"""
+        bname = self.level.collect(hc,hr)
+        if bname:
+            B = getattr(bodies,bname)
+            if B == self.special_ball:
+                self.special_ammo += B.ammo
+            else:
+                self.special_ball = B
+                self.special_ammo = B.ammo
+            self.sound("chamber")
+            self.event("collect",hc,hr)
+            self.event("ammo",self.special_ammo,B.__name__)
+
+    def step_balls(self,ms):
+        if not self.swept:
+            ms = min(ms,27.0) # avoid collision glitches when fps is low
+        player = self.player
+        dying = (self.mode == "dying")
+        pr = player.radius
+        ppos = player.pos
+        balls = self.balls
+        vs = [ball.velocity * ms for ball in balls]
+        radii = [ball.radius for ball in balls]
+        if self.swept:
+            for ball,v,r in zip(balls,vs,radii):
+                self.sweep_ball(ball,v,r,ms,dying)
+        else:
+            self.collide_balls(balls,vs,radii,ms,dying)
+        if dying or not balls:
+            return
+        nearby = self.nearby_balls
+        nearby.build(balls)
+        px,py,pz = ppos
+        for ball in nearby.near(px,py,pr + max(radii)):
+            if (ball.lethal
+                and (ball.pos - ppos).length() < (ball.radius + pr)):
+                self.die("{0} trauma".format(ball.__class__.__name__.lower()))
+
+    def ball_hits_hexagon(self,ball,hc,hr,dying):
+        """Let a ball destroy the hexagon it hit, if it can.
+        Return a true value if the hexagon was destroyed"""
+        if ball.maxdestroy > 0 and not dying:
+            points = self.level.destroy(hc,hr)
+            if points:
+                self.sound(points[1])
+                self.event("destroy",hc,hr)
+                self.flow.cell_changed(hc,hr)
+                if self.paths:
+                    self.paths.cell_changed(hc,hr)
+                if self.sight:
+                    self.sight.cell_changed(hc,hr)
+                self.walls.wall_removed(hc,hr,self.time)
+                ball.maxdestroy -= 1
+                ball.time_left -= 1000
+                self.inc_score(points[0])
+                return True
+        return False
+
+    def collide_balls(self,balls,vs,radii,ms,dying):
+        hits = collision.collides_batch(self.level,[b.pos for b in balls],
+                                        radii,vs,collision.COLLIDE_REBOUND)
+        for ball,v,r,(obs,P) in zip(balls,vs,radii,hits):
+            pos = ball.pos
+            newpos = v + pos
+            if P and self.level.hexes.get(obs[:2]) != obs[2]:
+                # an earlier ball destroyed this hexagon: test again
+                bx,by,bz = pos
+                near = self.level.obstacles_near(bx,by)
+                k,P = collision.collides_first(
+                    near,pos,r,v,collision.COLLIDE_REBOUND)
+                obs = near[k] if P else None
+            if P:
+                hc,hr,cell = obs
+                newpos, bv_times_ms = P
+                vel = bv_times_ms * (1.0/ms)
+                if self.ball_hits_hexagon(ball,hc,hr,dying):
+                    if not ball.bounces:
+                        vel = ball.velocity
+                    else:
+                        vel *= 0.95
+                ball.velocity = vel
+            ball.pos = newpos
+
+    def sweep_ball(self,ball,v,r,ms,dying):
+        """Move a ball with exact swept collisions, destroying
+        hexagons and bouncing off them as it goes"""
+        speed = [1.0]
+        def on_contact(obstacle,where,normal):
+            hc,hr,cell = obstacle
+            if self.ball_hits_hexagon(ball,hc,hr,dying):
+                if not ball.bounces:
+                    return False
+                speed[0] *= 0.95
+            return True
+        bx,by,bz = ball.pos
+        obstacles = self.level.obstacles_near(
+            bx,by,collision.sweep_reach(v,r))
+        newpos,bv_times_ms,contacts = collision.sweep(
+            obstacles,ball.pos,r,v,on_contact=on_contact)
+        if contacts:
+            ball.velocity = bv_times_ms * (speed[0]/ms)
+        ball.pos = newpos
+
+    def step_monsters(self,ms):
+        if not self.swept:
+            ms = min(ms,27.0) # avoid collision glitches when fps is low
+        player = self.player
+        dying = (self.mode == "dying")
+        pr = player.radius
+        ppos = Vec(player.pos)
+        mons = self.monsters
+        balls = self.balls
+        self.time += ms
+        self.flow.set_target(*hexgrid.pixel_to_hex(ppos.x,ppos.y))
+        if self.lod:
+            times = self.set_tiers(ms,ppos)
+        else:
+            times = [ms] * len(mons)
+        for mon in mons:
+            if mon.follows_player and mon.tier != bodies.DORMANT:
+                mon.steer(self.flow)
+        if self.predict_walls:
+            due = self.walls.due(self.time,self.turned_monsters())
+        else:
+            due = None
+        if self.store and due is not None and mons:
+            busy,quiet = self.quiet_monsters(mons,times,due,dying,ppos)
+        else:
+            busy,quiet = range(len(mons)),None
+        mons = [mons[i] for i in busy]
+        times = [times[i] for i in busy]
+        nearby = self.nearby_balls
+        nearby.build(balls)
+        maxbr = max([ball.radius for ball in balls] or [0])
+        vs = [mon.velocity * t for mon,t in zip(mons,times)]
+        radii = [mon.radius for mon in mons]
+        hits = [(None,False)] * len(mons)
+        batch = []
+        for i,(mon,t) in enumerate(zip(mons,times)):
+            if due is not None and mon not in due:
+                continue # can't reach a wall this step
+            if t and (self.swept or t > ms):
+                # catching up after moving less often: sweep, so
+                # the long step can't jump through a wall
+                hits[i] = self.sweep_monster(mon,vs[i],radii[i])
+            elif t:
+                batch.append(i)
+        if batch:
+            found = collision.collides_batch(
+                self.level,[mons[i].pos for i in batch],
+                [radii[i] for i in batch],[vs[i] for i in batch],
+                collision.COLLIDE_REBOUND)
+            for i,hit in zip(batch,found):
+                hits[i] = hit
+        for n,mon,t,v,r,(obs,P) in zip(busy,mons,times,vs,radii,hits):
+            newpos = v + mon.pos
+            collided = False
+            if P:
+                newpos, mv_times_ms = P
+                velocity = mv_times_ms * (1.0/t)
+                mon.on_collision(None,newpos,velocity)
+                collided = True
+            if not dying:
+                nx,ny,nz = newpos
+                for ball in nearby.near(nx,ny,r + maxbr):
+                    if (ball.pos - newpos).length() < (r + ball.radius):
+                        mon.on_collision(ball,newpos,mon.velocity)
+                        collided = True
+                        break
+            if mon.expired:
+                if quiet:
+                    # only those before this one, as if in one loop
+                    self.move_quiet(quiet,n)
+                return
+            if not collided:
+                mon.pos = newpos
+            if due is not None and (collided or (t and mon in due)):
+                self.walls.schedule(mon,self.time - mon.owed)
+            if not dying and (mon.pos - ppos).length() < (r + pr):
+                mon.on_collision(player,newpos,(ppos - mon.pos)*0.01)
+                self.die("{0} {1}".format(
+                        mon.harm_type,
+                        mon.__class__.__name__))
+        if quiet:
+            self.move_quiet(quiet)
+
+    def turned_monsters(self):
+        """Monsters whose velocity may have changed since the last
+        step, for the WallSchedule to check"""
+        store = self.store
+        if store is None:
+            return self.monsters
+        turned = [store.bodies[i] for i in store.turned]
+        store.turned.clear()
+        return [b for b in turned if isinstance(b,bodies.Monster)]
+
+    def quiet_monsters(self,mons,times,due,dying,ppos):
+        """Sort out, all at once in the EntityStore, the monsters that
+        just need moving along this step: those that aren't due to
+        touch a wall and won't be touching a ball or the player.
+        Return (indices in mons of the rest, which need their rules
+        run, (indices,rows,times) of the quiet ones)"""
+        store = self.store
+        S = store.slots(mons)
+        T = entities.numpy.array(times,float)
+        x = store.x[S] + store.vx[S] * T
+        y = store.y[S] + store.vy[S] * T
+        # a monster that isn't moving this step (DORMANT, or REDUCED
+        # and not its turn) stays due until it does move
+        busy = entities.numpy.in1d(S,[m.slot for m in due]) & (T > 0)
+        if not dying:
+            r = store.radius[S]
+            if self.balls:
+                busy |= store.touching(x,y,r,store.slots(self.balls))
+            busy |= store.touching(x,y,r,store.slots([self.player]))
+        quiet = entities.numpy.flatnonzero(~busy)
+        return (list(entities.numpy.flatnonzero(busy)),
+                (quiet,S[quiet],T[quiet]))
+
+    def move_quiet(self,quiet,before=None):
+        """Move the quiet monsters (see quiet_monsters), or those
+        before index before"""
+        indices,rows,times = quiet
+        if before is not None:
+            k = indices.searchsorted(before)
+            rows,times = rows[:k],times[:k]
+        self.store.advance(rows,times)
+
+    def set_tiers(self,ms,ppos):
+        """Sort the monsters by how much attention they need, and
+        return how many ms each should move this step:
+
+          FULL    within lod_near of the player: every step
+          REDUCED further off: every lod_skip steps, by all the
+                  time owed since it last moved
+          DORMANT couldn't get within lod_near of the player in
+                  lod_horizon ms at its speed: doesn't move at all
+
+        Monsters of every tier can still be hit by balls, which
+        may wake them up."""
+        self.ticks += 1
+        times = []
+        for i,(mon,tier) in enumerate(zip(self.monsters,self.tiers(ppos))):
+            mon.tier = tier
+            if tier == bodies.DORMANT:
+                mon.owed = 0
+                times.append(0)
+            elif tier == bodies.FULL:
+                times.append(ms + mon.owed)
+                mon.owed = 0
+            elif (self.ticks + i) % self.lod_skip == 0:
+                times.append(ms + mon.owed)
+                mon.owed = 0
+            else:
+                mon.owed += ms
+                times.append(0)
+        return times
+
+    def tiers(self,ppos):
+        """The tier of each monster (see set_tiers), worked out all
+        at once in the EntityStore if there is one"""
+        near,horizon = self.lod_near,self.lod_horizon
+        mons = self.monsters
+        store = self.store
+        if store and mons:
+            S = store.slots(mons)
+            px,py,pz = ppos
+            d = entities.numpy.sqrt((store.x[S] - px) ** 2 +
+                                    (store.y[S] - py) ** 2 +
+                                    (store.z[S] - pz) ** 2)
+            speed = entities.numpy.sqrt(store.vx[S] ** 2 + store.vy[S] ** 2
+                                        + store.vz[S] ** 2)
+            tier = entities.numpy.where(speed * horizon < d - near,
+                                        bodies.DORMANT,bodies.REDUCED)
+            tier[d <= near] = bodies.FULL
+            return tier.tolist()
+        tiers = []
+        for mon in mons:
+            d = (mon.pos - ppos).length()
+            if d <= near:
+                tiers.append(bodies.FULL)
+            elif mon.velocity.length() * horizon < d - near:
+                tiers.append(bodies.DORMANT)
+            else:
+                tiers.append(bodies.REDUCED)
+        return tiers
+
+    def sweep_monster(self,mon,v,r):
+        """Swept collision of a monster with the walls, stopping at
+        the first contact. Return (obstacle,(position,rebound)) like
+        collision.collides_batch() does."""
+        mx,my,mz = mon.pos
+        obstacles = self.level.obstacles_near(
+            mx,my,collision.sweep_reach(v,r))
+        P,rebound,contacts = collision.sweep(
+            obstacles,mon.pos,r,v,max_contacts=1)
+        if contacts:
+            return contacts[0][0],(P,rebound)
+        return None,False
+
+    def step_bodies(self,ms):
+        """Let balls and monsters age, and remove any that
+        expired in an earlier step.  With an EntityStore, the balls
+        are aged all at once, as Ball.step() would."""
+        store = self.store
+        for mon in self.monsters:
+            if mon.expired:
+                self.walls.forget(mon)
+        for group in (self.monsters,self.balls):
+            if store:
+                for b in group:
+                    if b.expired:
+                        store.remove(b)
+            group[:] = [b for b in group if not b.expired]
+        for mon in self.monsters:
+            mon.step(ms)
+        if store and self.balls:
+            for i in store.age(store.slots(self.balls),ms):
+                store.bodies[i].expired = True
+        else:
+            for ball in self.balls:
+                ball.step(ms)
+
+    def die(self,dying_of=""):
+        if self.mode != "playing":
+            return
+        self.sound("pain")
+        self.mode = "dying"
+        self.dying_of = dying_of
+        self.dying_time = World.dying_time
+        self.event("die",dying_of)
+
+    def step(self,ms,inputs=None):
+        """Advance the world by ms milliseconds"""
+        self.events = []
+        if ms == 0 or self.mode in ("dead","exited"):
+            return
+        if self.stream:
+            self.stream.update(self)
+        if inputs is None:
+            inputs = Inputs()
+        if self.mode == "playing":
+            if inputs.give_up:
+                self.die("boredom")
+            else:
+                for direction in inputs.launch:
+                    self.add_ball(direction)
+                    self.reload = self.reload_time
+                for direction,special in inputs.fire:
+                    self.fire(direction,special)
+        if self.reload > 0:
+            self.reload = max(0,self.reload - ms)
+        self.step_monsters(ms)
+        self.step_balls(ms)
+        self.step_bodies(ms)
+        if self.mode == "dying":
+            if self.dying_time <= 0:
+                self.mode = "dead"
+                self.event("dead")
+            else:
+                self.dying_time -= ms
+        else:
+            self.step_player(ms,inputs)